@@ -0,0 +1,201 @@
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import resource
+import tempfile
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import musicbrainzngs
+import inferno
+from synthetic import ALBUM_SIZES, WRITERS, make_library
+from standins import start_standins
+
+# inferno configuration pointing every service at the stand-ins
+def benchmark_config(base_url, output_dir, trackers, inject_mode="url"):
+    config = {
+        "display_logo": False,
+        "output_dir": output_dir,
+        "clear_output_dir": False,
+        "file_types": list(WRITERS),
+        "valid_cover_art": ["cover.jpg", "front.jpg", "{artist} - {album}.jpg"],
+        "tracklist_filename": "tracklist.txt",
+        "tag_workers": 8,
+        "hash_workers": 0,
+        "hash_cache_max_age": 30,
+        "signature": "inferno benchmark",
+        "musicbrainz_rate_limit": 50.0,
+        "musicbrainz_cache_days": 30,
+        "cover_art_workers": 4,
+        "imgbb_url": f"{base_url}/1/upload",
+        "imgbb_api_key": "BENCHMARK",
+        "musicbrainz_user_agent": {"name": "inferno-benchmark", "version": "1.0", "email": "benchmark@localhost"},
+        "http": {"retries": 0},
+        "qBittorrent": {"qb_url": base_url, "username": "bench", "password": "bench", "category": "MUSIC", "tags": "MUSIC", "paused": "true", "inject_mode": inject_mode},
+        "trackers": {},
+    }
+    for tracker_name in trackers:
+        config["trackers"][tracker_name] = {
+            "tracker_announce": f"{base_url}/announce/{tracker_name}",
+            "tracker_api_url": f"{base_url}/api/torrents/upload",
+            "tracker_api_token": "BENCHMARK",
+            "category_id": 3,
+            "type_ids": {"flac": 7, "mp3": 8, "m4a": 9},
+        }
+        # The stand-in has no torrent downloads, injected files are always our own
+        if inject_mode == "file":
+            config["trackers"][tracker_name]["torrent_source"] = tracker_name.upper()
+    # Same defaults and checks as config.toml
+    config, problems = inferno.validate_config(config)
+    if problems:
+        raise ValueError("; ".join(problems))
+    return config
+
+# Offline MusicBrainz index of the synthetic albums, built from a small JSON dump like the real release file.
+# Release IDs end in -2, the ones the Cover Art Archive stand-in has images for
+def build_benchmark_index(work_dir, artist, count):
+    dump_path = os.path.join(work_dir, "release")
+    with open(dump_path, "w") as f:
+        for n in range(count):
+            release = {
+                "id": f"bench-index-{n}-2",
+                "title": f"Album {n + 1}",
+                "artist-credit": [{"name": artist, "joinphrase": ""}],
+                "cover-art-archive": {"front": True, "count": 1},
+            }
+            f.write(json.dumps(release) + "\n")
+    index_path = os.path.join(work_dir, "musicbrainz.sqlite")
+    with contextlib.redirect_stdout(io.StringIO()):
+        inferno.build_musicbrainz_index(dump_path, index_path)
+    return index_path
+
+# Peak resident set size in MB of this process and of its finished child processes (hash pool, mediainfo)
+def peak_rss_mb():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return own / scale, children / scale
+
+# Process the library with inferno's batch mode and collect the numbers of the run
+def run_benchmark(artist_directory, album_count, config, output_dir, trackers, args):
+    # force: every run does the full work, the upload ledger would skip albums of an earlier run
+    job = inferno.AlbumJob(directory=artist_directory, tracker_names=trackers, source="WEB", bitrate=args.bitrate,
+                           inject=args.inject, no_hash_cache=not args.hash_cache, force=True)
+
+    # inferno prints a lot, the benchmark only shows it with --verbose
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    # The per-album reports give the stage timings below
+    inferno.keep_album_reports()
+    started = time.perf_counter()
+    with output:
+        inferno.batch_process(artist_directory, job, config, output_dir, args.jobs)
+    elapsed = time.perf_counter() - started
+
+    # Stage timings and counters come from inferno's own album reports
+    stage_times = {}
+    for report in inferno.album_reports:
+        for name, seconds in report["stages"].items():
+            stage_times.setdefault(name, []).append(seconds)
+    summary = inferno.run_summary(elapsed, max(1, args.jobs))
+
+    own_rss, children_rss = peak_rss_mb()
+    return {
+        "albums": album_count,
+        "seconds": round(elapsed, 3),
+        "albums_per_minute": round(album_count / elapsed * 60, 2) if elapsed else None,
+        "peak_rss_mb": round(own_rss, 1),
+        "peak_child_rss_mb": round(children_rss, 1),
+        "statuses": summary["statuses"],
+        "stages": {
+            name: {
+                "calls": len(times),
+                "total": round(sum(times), 3),
+                "mean": round(sum(times) / len(times), 3),
+                "max": round(max(times), 3),
+            }
+            for name, times in stage_times.items()
+        },
+        "counters": summary["counters"],
+        "hosts": summary["hosts"],
+    }
+
+def print_report(result, requests):
+    print(f"\n+ Benchmark +\n{'━' * 50}")
+    print(f"{result['albums']} albums in {result['seconds']:.2f}s ({result['albums_per_minute']} albums/minute)")
+    print(f"Peak RSS: {result['peak_rss_mb']} MB (child processes {result['peak_child_rss_mb']} MB)")
+    print(", ".join(f"{count} {status}" for status, count in result["statuses"].items()))
+    print(f"\n{'Stage':<12}  {'Calls':>5}  {'Total':>8}  {'Mean':>8}  {'Max':>8}")
+    for name, stage in result["stages"].items():
+        print(f"{name:<12}  {stage['calls']:>5}  {stage['total']:>7.2f}s  {stage['mean']:>7.2f}s  {stage['max']:>7.2f}s")
+    if result["counters"]:
+        print()
+        for name, value in result["counters"].items():
+            print(f"{name.replace('_', ' ').capitalize()}: {value}")
+    http = {}
+    for counters in result["hosts"].values():
+        for name, value in counters.items():
+            http[name] = http.get(name, 0) + value
+    print(f"HTTP: {http.get('requests', 0)} requests, {http.get('retries', 0)} retries, {http.get('errors', 0)} errors, {http.get('seconds', 0):.2f}s")
+    print(f"\n{'Stand-in requests':<20}  Count")
+    for service, count in sorted(requests.items()):
+        print(f"{service:<20}  {count}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inferno on synthetic albums against local stand-in services.")
+    parser.add_argument("-n", "--count", type=int, default=4, help="Number of albums. Defaults to 4.")
+    parser.add_argument("--shape", choices=ALBUM_SIZES, default="album", help="Album size, from a single up to a 10-disc box set.")
+    parser.add_argument("--format", choices=[file_type.lstrip(".") for file_type in WRITERS], default="flac", help="Audio format.")
+    parser.add_argument("--track-mb", type=float, help="Size of every track in MB, overrides the album shape.")
+    parser.add_argument("--no-cover", action="store_true", help="Albums without cover.jpg, so cover art comes from the MusicBrainz stand-in.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Albums processed at the same time. Defaults to 1.")
+    parser.add_argument("-t", "--trackers", type=int, default=1, help="Number of trackers to upload every album to. Defaults to 1.")
+    parser.add_argument("-i", "--inject", action="store_true", help="Inject the torrents into the qBittorrent stand-in.")
+    parser.add_argument("--inject-mode", choices=["url", "file"], default="url", help="How torrents are injected with -i: by URL, or as .torrent files in batches.")
+    parser.add_argument("-br", "--bitrate", help="Bitrate label of the uploads. Derived from the synthetic files if not given.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds every stand-in request waits. Defaults to 0.05.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds of random delay per request.")
+    parser.add_argument("--mb-index", action="store_true", help="Look up cover art in an offline MusicBrainz index of the albums (use with --no-cover).")
+    parser.add_argument("--hash-cache", action="store_true", help="Keep inferno's hash cache enabled (measures warm reruns with --library).")
+    parser.add_argument("--library", help="Directory for the synthetic albums. Kept between runs, defaults to a temporary directory.")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON, for comparing runs.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show inferno's output.")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="inferno-bench-")
+    try:
+        library = args.library or os.path.join(work_dir, "library")
+        artist = "Synthetic Artist"
+        make_library(library, args.count, args.shape, f".{args.format}", artist, track_mb=args.track_mb, cover=not args.no_cover)
+
+        server = start_standins(args.latency, args.jitter)
+        host = server.url.split("://", 1)[1]
+        trackers = [f"bench{n + 1}" for n in range(args.trackers)]
+        # The hash cache and lookup caches live in the output directory, kept only with --library
+        output_dir = os.path.join(args.library, ".bench-output") if args.library else os.path.join(work_dir, "output")
+        config = benchmark_config(server.url, output_dir, trackers, args.inject_mode)
+        if args.mb_index:
+            config["musicbrainz_index"] = build_benchmark_index(work_dir, artist, args.count)
+
+        inferno.setup_musicbrainz(config)
+        inferno.setup_http(config)
+        musicbrainzngs.set_hostname(host, use_https=False)
+        musicbrainzngs.set_caa_hostname(host, use_https=False)
+
+        result = run_benchmark(os.path.join(library, artist), args.count, config, output_dir, trackers, args)
+        server.shutdown()
+
+        if args.json:
+            print(json.dumps({**result, "requests": server.requests}, indent=2))
+        else:
+            print_report(result, server.requests)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
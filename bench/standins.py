@@ -0,0 +1,147 @@
+import re
+import sys
+import zlib
+import json
+import time
+import random
+import itertools
+import threading
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-ins for the services inferno talks to: the UNIT3D upload API, imgBB, qBittorrent's /api/v2,
+# the MusicBrainz web service and the Cover Art Archive. Every request waits `latency` seconds (plus up to
+# `jitter`) before it is answered, so network bound stages behave like against the real services
+
+QB_COOKIE = "SID=inferno-bench"
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, code, body, content_type="application/json", headers=()):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(code)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Count the request under its service and wait out the configured latency
+    def wait(self, service):
+        self.server.count(service)
+        delay = self.server.latency + random.uniform(0, self.server.jitter)
+        if delay:
+            time.sleep(delay)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+
+        # MusicBrainz release search, a few releases per query
+        if url.path == "/ws/2/release/":
+            self.wait("musicbrainz search")
+            query = parse_qs(url.query).get("query", [""])[0]
+            releases = "".join(
+                f'<release id="bench-{zlib.crc32(query.encode())}-{n}"><title>Release {n}</title></release>'
+                for n in range(self.server.releases)
+            )
+            body = f'<?xml version="1.0" encoding="UTF-8"?><metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#"><release-list count="{self.server.releases}" offset="0">{releases}</release-list></metadata>'
+            return self.send(200, body.encode(), "application/xml")
+
+        # Cover Art Archive, only the last release of a search has cover art
+        match = re.fullmatch(r"/release/([^/]+)/?", url.path)
+        if match:
+            self.wait("cover art archive")
+            if match.group(1).endswith(f"-{self.server.releases - 1}"):
+                image = f"http://{self.headers['Host']}/images/{match.group(1)}.jpg"
+                return self.send(200, {"images": [{"front": True, "image": image}]})
+            return self.send(404, b"No cover art found", "text/plain")
+
+        # Cover image downloads
+        if url.path.startswith("/images/"):
+            self.wait("cover download")
+            return self.send(200, b"\xff\xd8\xff\xe0" + b"\0" * 64 * 1024 + b"\xff\xd9", "image/jpeg")
+
+        self.wait("unknown")
+        self.send(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        # imgBB image upload
+        if url.path == "/1/upload":
+            self.wait("imgbb upload")
+            image_url = f"http://{self.headers['Host']}/images/{next(self.server.image_ids)}.jpg"
+            return self.send(200, {"data": {"url": image_url, "medium": {"url": image_url}}, "success": True, "status": 200})
+
+        # UNIT3D torrent upload
+        if url.path == "/api/torrents/upload":
+            self.wait("unit3d upload")
+            torrent_id = next(self.server.torrent_ids)
+            return self.send(200, {"success": True, "data": f"http://{self.headers['Host']}/torrent/download/{torrent_id}", "message": "Torrent uploaded successfully."})
+
+        # qBittorrent login and torrent injection
+        if url.path == "/api/v2/auth/login":
+            self.wait("qbittorrent login")
+            return self.send(200, b"Ok.", "text/plain", [("Set-Cookie", f"{QB_COOKIE}; path=/")])
+        if url.path == "/api/v2/torrents/add":
+            self.wait("qbittorrent add")
+            if QB_COOKIE not in (self.headers.get("Cookie") or ""):
+                return self.send(403, b"Forbidden", "text/plain")
+            return self.send(200, b"Ok.", "text/plain")
+
+        self.wait("unknown")
+        self.send(404, {"message": "Not Found"})
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, releases=3):
+        super().__init__(address, StandinHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.releases = releases
+        self.requests = {}
+        self.requests_lock = threading.Lock()
+        self.image_ids = itertools.count(1)
+        self.torrent_ids = itertools.count(1)
+
+    # Count a request by service
+    def count(self, service):
+        with self.requests_lock:
+            self.requests[service] = self.requests.get(service, 0) + 1
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+# Start the stand-ins on a free localhost port in a background thread
+def start_standins(latency=0.0, jitter=0.0, releases=3, port=0):
+    server = StandinServer(("127.0.0.1", port), latency, jitter, releases)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-ins for UNIT3D, imgBB, qBittorrent and MusicBrainz.")
+    parser.add_argument("-p", "--port", type=int, default=8700, help="Port to listen on. Defaults to 8700.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds every request waits before it is answered.")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds of random delay.")
+    args = parser.parse_args()
+
+    server = start_standins(args.latency, args.jitter, port=args.port)
+    print(f"Stand-ins listening on {server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Commands timed by the startup benchmark, each in a fresh interpreter so nothing is imported yet
+COMMANDS = {
+    "python": [sys.executable, "-c", "pass"],
+    "import inferno": [sys.executable, "-c", "import inferno"],
+    "inferno --help": [sys.executable, "inferno.py", "--help"],
+}
+
+# Wall time of `command` in seconds, `runs` times
+def time_command(command, runs):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - started)
+    return times
+
+# Modules inferno imports that took longest, from python -X importtime (cumulative microseconds per import)
+def slowest_imports(count):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import inferno"], cwd=ROOT, capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is shown by two spaces per level and a module is listed after everything it imported,
+        # so the level 1 entries right before inferno's own line are inferno's imports
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            imports.append((int(cumulative) / 1000, name.strip()))
+        elif depth == 0:
+            if name.strip() == "inferno":
+                imports.append((int(cumulative) / 1000, "inferno"))
+                break
+            imports = []
+    return sorted(imports, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long inferno takes to start.")
+    parser.add_argument("-n", "--runs", type=int, default=10, help="Runs per command. Defaults to 10.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list. Defaults to 10.")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON, for comparing runs.")
+    args = parser.parse_args()
+
+    result = {"commands": {}, "imports": []}
+    for name, command in COMMANDS.items():
+        times = time_command(command, args.runs)
+        result["commands"][name] = {
+            "runs": args.runs,
+            "median": round(statistics.median(times), 4),
+            "min": round(min(times), 4),
+            "max": round(max(times), 4),
+        }
+    result["imports"] = [{"module": name, "ms": round(ms, 1)} for ms, name in slowest_imports(args.top)]
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"\n+ Startup +\n{'━' * 50}")
+    print(f"{'Command':<16}  {'Median':>8}  {'Min':>8}  {'Max':>8}")
+    for name, timing in result["commands"].items():
+        print(f"{name:<16}  {timing['median'] * 1000:>6.1f}ms  {timing['min'] * 1000:>6.1f}ms  {timing['max'] * 1000:>6.1f}ms")
+    print(f"\n{'Import':<28}  {'Cumulative':>10}")
+    for entry in result["imports"]:
+        print(f"{entry['module']:<28}  {entry['ms']:>8.1f}ms")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import os
+import sys
+import random
+import struct
+import argparse
+from mutagen.flac import FLAC
+from mutagen.easyid3 import EasyID3
+from mutagen.easymp4 import EasyMP4
+
+# Album shapes of the benchmark: (discs, tracks per disc, MB per track)
+ALBUM_SIZES = {
+    "single": (1, 2, 8),
+    "ep": (1, 5, 10),
+    "album": (1, 12, 30),
+    "double": (2, 12, 30),
+    "boxset": (10, 15, 25),
+}
+
+# Random audio payload is written in blocks of this size
+WRITE_BLOCK_SIZE = 1024 * 1024
+
+# Write `size` random bytes, seeded so reruns build the same files and hashes
+def write_payload(f, size, rng):
+    while size > 0:
+        block = min(size, WRITE_BLOCK_SIZE)
+        f.write(rng.randbytes(block))
+        size -= block
+
+# FLAC STREAMINFO block for a 16bit 44.1kHz stereo stream of `seconds` length
+def flac_streaminfo(seconds, sample_rate=44100, channels=2, bits_per_sample=16):
+    samples = (sample_rate << 44) | ((channels - 1) << 41) | ((bits_per_sample - 1) << 36) | (sample_rate * seconds)
+    return struct.pack(">HH", 4096, 4096) + b"\0" * 6 + samples.to_bytes(8, "big") + b"\0" * 16
+
+def write_flac(path, size, rng, tags):
+    streaminfo = flac_streaminfo(max(1, size // 176400))
+    with open(path, "wb") as f:
+        f.write(b"fLaC" + bytes([0x80]) + len(streaminfo).to_bytes(3, "big") + streaminfo)
+        write_payload(f, size, rng)
+    audio = FLAC(path)
+    audio.update(tags)
+    audio.save()
+
+# MPEG-1 Layer III frames at 128kbps 44.1kHz (417 bytes each), enough for mutagen to read the stream info
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x64"
+MP3_FRAME_SIZE = 417
+
+def write_mp3(path, size, rng, tags):
+    with open(path, "wb") as f:
+        for _ in range(max(1, size // MP3_FRAME_SIZE)):
+            f.write(MP3_FRAME_HEADER + rng.randbytes(MP3_FRAME_SIZE - len(MP3_FRAME_HEADER)))
+    audio = EasyID3()
+    audio.update(tags)
+    audio.save(path)
+
+# MP4 atom with a 32bit size
+def mp4_atom(name, *payload):
+    data = b"".join(payload)
+    return struct.pack(">I4s", 8 + len(data), name) + data
+
+# Smallest MP4 audio track mutagen accepts: one AAC (mp4a) sample entry with an esds descriptor
+def mp4_audio_track(seconds, sample_rate=44100, channels=2, bitrate=256000):
+    timescale = sample_rate
+    duration = seconds * sample_rate
+    mvhd = mp4_atom(b"mvhd", struct.pack(">B3xIIII", 0, 0, 0, timescale, duration), b"\0" * 80)
+    mdhd = mp4_atom(b"mdhd", struct.pack(">B3xIIIIHH", 0, 0, 0, timescale, duration, 0x55C4, 0))
+    hdlr = mp4_atom(b"hdlr", struct.pack(">B3xI4s12x", 0, 0, b"soun"), b"SoundHandler\0")
+    decoder_config = bytes([0x04, 13, 0x40, 0x15]) + b"\0\0\0" + struct.pack(">II", bitrate, bitrate)
+    es_descriptor = bytes([0x03, 3 + len(decoder_config)]) + b"\0\0\0" + decoder_config
+    esds = mp4_atom(b"esds", b"\0\0\0\0", es_descriptor)
+    mp4a = mp4_atom(b"mp4a", b"\0" * 6, struct.pack(">H", 1), b"\0" * 8, struct.pack(">HHHHI", channels, 16, 0, 0, sample_rate << 16), esds)
+    stsd = mp4_atom(b"stsd", struct.pack(">B3xI", 0, 1), mp4a)
+    minf = mp4_atom(b"minf", mp4_atom(b"stbl", stsd))
+    trak = mp4_atom(b"trak", mp4_atom(b"mdia", mdhd, hdlr, minf))
+    return mp4_atom(b"ftyp", b"M4A \0\0\0\0M4A mp42isom") + mp4_atom(b"moov", mvhd, trak)
+
+def write_m4a(path, size, rng, tags):
+    with open(path, "wb") as f:
+        f.write(mp4_audio_track(max(1, size // 32000)))
+        f.write(struct.pack(">I4s", 8 + size, b"mdat"))
+        write_payload(f, size, rng)
+    audio = EasyMP4(path)
+    audio.update(tags)
+    audio.save()
+
+WRITERS = {".flac": write_flac, ".mp3": write_mp3, ".m4a": write_m4a}
+
+# Write one synthetic album below `root` and return its directory. Box sets get a track number per disc
+def make_album(root, artist, album, year, shape="album", file_type=".flac", seed=0, track_mb=None, cover=True):
+    discs, tracks_per_disc, default_mb = ALBUM_SIZES[shape]
+    size = int((track_mb or default_mb) * 1024 * 1024)
+    rng = random.Random(f"{seed}:{artist}:{album}")
+    album_dir = os.path.join(root, artist, f"{album} ({year})")
+    os.makedirs(album_dir, exist_ok=True)
+
+    for disc in range(1, discs + 1):
+        for track in range(1, tracks_per_disc + 1):
+            prefix = f"{disc}-{track:02d}" if discs > 1 else f"{track:02d}"
+            path = os.path.join(album_dir, f"{prefix} Track {track}{file_type}")
+            if os.path.exists(path):
+                continue
+            tags = {
+                "artist": artist,
+                "album": album,
+                "date": str(year),
+                "title": f"Track {track}",
+                "tracknumber": str(track),
+                "discnumber": str(disc),
+            }
+            WRITERS[file_type](path, size + rng.randrange(4096), rng, tags)
+
+    # Small JPEG-looking cover so the local cover art path is taken. Without it inferno goes to MusicBrainz
+    cover_path = os.path.join(album_dir, "cover.jpg")
+    if cover and not os.path.exists(cover_path):
+        with open(cover_path, "wb") as f:
+            f.write(b"\xff\xd8\xff\xe0" + rng.randbytes(64 * 1024) + b"\xff\xd9")
+    return album_dir
+
+# Build a library of `count` albums of one shape for one artist. Existing files are kept, so reruns are cheap
+def make_library(root, count, shape="album", file_type=".flac", artist="Synthetic Artist", seed=0, track_mb=None, cover=True):
+    return [
+        make_album(root, artist, f"Album {n + 1}", 2000 + n, shape, file_type, seed, track_mb, cover)
+        for n in range(count)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic albums for the inferno benchmark.")
+    parser.add_argument("root", help="Directory to write the albums to.")
+    parser.add_argument("-n", "--count", type=int, default=3, help="Number of albums. Defaults to 3.")
+    parser.add_argument("--shape", choices=ALBUM_SIZES, default="album", help="Album size, from a single up to a 10-disc box set.")
+    parser.add_argument("--format", choices=[file_type.lstrip(".") for file_type in WRITERS], default="flac", help="Audio format.")
+    parser.add_argument("--track-mb", type=float, help="Size of every track in MB, overrides the album shape.")
+    parser.add_argument("--no-cover", action="store_true", help="Leave out cover.jpg so cover art is looked up on MusicBrainz.")
+    args = parser.parse_args()
+
+    for album_dir in make_library(args.root, args.count, args.shape, f".{args.format}", track_mb=args.track_mb, cover=not args.no_cover):
+        print(album_dir)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,195 @@
 import os
+import re
 import sys
+import mmap
+import time
+import struct
+import select
+import socket
+import signal
+import multiprocessing
+import ctypes
+import ctypes.util
+import bisect
+import hashlib
+import sqlite3
+import fnmatch
+import functools
+import itertools
 import shutil
 import subprocess
+import threading
+import contextlib
+import contextvars
+import json
+import datetime
+import dataclasses
+import pathlib
 import tomli
+import importlib
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
 import argparse
-import requests
-import musicbrainzngs
-from mutagen import File
-from torf import Torrent
-
-# Load configuration from a TOML file in the 'config' directory
-def load_config():
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    config_file = os.path.join(base_dir, "config", "config.toml")
+import io
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+# Module imported on first attribute access. requests, mutagen and torf make up most of the startup time
+# and are not needed for --help, dry runs or albums the upload ledger skips (cProfile only for --profile)
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+requests = LazyModule("requests")
+mutagen = LazyModule("mutagen")
+torf = LazyModule("torf")
+cProfile = LazyModule("cProfile")
+pstats = LazyModule("pstats")
+
+# Settings of config.toml with their types and the defaults used when a setting is missing
+CONFIG_SETTINGS = {
+    "inferno_logo": (str, "config/logo.txt"),
+    "display_logo": (bool, True),
+    "output_dir": (str, ""),
+    "clear_output_dir": (bool, False),
+    "file_types": (list, [".flac", ".mp3", ".m4a"]),
+    "valid_cover_art": (list, ["cover.jpg", "front.jpg", "{artist} - {album}.jpg"]),
+    "tracklist_filename": (str, "tracklist.txt"),
+    "mediainfo_json": (bool, False),
+    "tag_workers": (int, 8),
+    "reject_inconsistent_albums": (bool, True),
+    "hash_workers": (int, 0),
+    "hash_cache_max_age": ((int, float), 30),
+    "cache_dir": (str, None),
+    "prometheus_textfile": (str, None),
+    "signature": (str, ""),
+    "watch_settle_seconds": ((int, float), 30),
+    "watch_incomplete_suffixes": (list, [".!qB", ".part"]),
+    "watch_polling": (bool, False),
+    "watch_poll_interval": ((int, float), 10),
+    "musicbrainz_rate_limit": ((int, float), 1.0),
+    "musicbrainz_cache_days": ((int, float), 30),
+    "musicbrainz_index": (str, None),
+    "cover_art_workers": (int, 4),
+    "cover_max_dimension": (int, 0),
+    "cover_max_size_mb": ((int, float), 0),
+    "cover_jpeg_quality": (int, 90),
+    "imgbb_url": (str, "https://api.imgbb.com/1/upload"),
+    "imgbb_api_key": (str, ""),
+    "musicbrainz_user_agent": (dict, {}),
+    "http": (dict, {}),
+    "qBittorrent": (dict, {}),
+    "trackers": (dict, {}),
+}
+
+# Settings of a [trackers.NAME] table. The first three are required for every tracker a run uploads to
+TRACKER_SETTINGS = {
+    "tracker_announce": (str, None),
+    "tracker_api_url": (str, None),
+    "tracker_api_token": (str, None),
+    "category_id": (int, None),
+    "type_ids": (dict, {}),
+    "torrent_source": (str, None),
+    "upload_rate": ((int, float), 0),
+    "upload_burst": (int, 1),
+    "upload_concurrency": (int, 2),
+    "upload_throttle_retries": (int, 5),
+}
+REQUIRED_TRACKER_SETTINGS = ("tracker_announce", "tracker_api_url", "tracker_api_token")
+
+# Settings of the [qBittorrent] table
+QBITTORRENT_SETTINGS = {
+    "qb_url": (str, None),
+    "username": (str, None),
+    "password": (str, None),
+    "category": (str, ""),
+    "tags": (str, ""),
+    "paused": (str, "false"),
+    "inject_mode": (str, "url"),
+    "inject_batch_size": (int, 20),
+}
+QB_INJECT_MODES = ("url", "file")
+
+# Settings of the [http] table
+HTTP_SETTINGS = {
+    "connect_timeout": ((int, float), None),
+    "read_timeout": ((int, float), None),
+    "retries": (int, None),
+    "backoff_factor": ((int, float), None),
+    "max_retry_after": ((int, float), None),
+    "pool_size": (int, None),
+}
+
+# Type name for error messages, e.g. 'int or float'
+def type_names(types):
+    return " or ".join(t.__name__ for t in (types if isinstance(types, tuple) else (types,)))
+
+# Settings with a lower bound. A token bucket with a rate of 0 would never let a request through, thread pools
+# need a worker and urllib3 refuses timeouts of 0. upload_rate = 0 turns the tracker's rate limit off and
+# hash_workers = 0 picks the worker count from the CPUs
+POSITIVE_SETTINGS = {"musicbrainz_rate_limit", "tag_workers", "cover_art_workers", "connect_timeout", "read_timeout", "pool_size"}
+NON_NEGATIVE_SETTINGS = {"upload_rate", "hash_workers", "retries", "backoff_factor", "max_retry_after"}
+
+# Fill in defaults and check the type and range of every known setting of `values`, problems are added to `problems`
+def check_settings(values, settings, prefix, problems):
+    checked = dict(values)
+    for key, (types, default) in settings.items():
+        if key not in checked:
+            if default is not None:
+                checked[key] = default.copy() if isinstance(default, (list, dict)) else default
+            continue
+        value = checked[key]
+        # bool is a subclass of int, but `hash_workers = true` is still a mistake
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in (types if isinstance(types, tuple) else (types,))):
+            problems.append(f"'{prefix}{key}' must be {type_names(types)}, not {type(value).__name__} ({value!r})")
+        elif key in POSITIVE_SETTINGS and value <= 0:
+            problems.append(f"'{prefix}{key}' must be greater than 0, not {value!r}")
+        elif key in NON_NEGATIVE_SETTINGS and value < 0:
+            problems.append(f"'{prefix}{key}' must be 0 or more, not {value!r}")
+    return checked
+
+# Validate a parsed configuration once. Returns the configuration with defaults filled in and a list of problems
+def validate_config(config):
+    problems = []
+    config = check_settings(config, CONFIG_SETTINGS, "", problems)
+    if isinstance(config["http"], dict):
+        config["http"] = check_settings(config["http"], HTTP_SETTINGS, "http.", problems)
+    if isinstance(config["qBittorrent"], dict):
+        config["qBittorrent"] = check_settings(config["qBittorrent"], QBITTORRENT_SETTINGS, "qBittorrent.", problems)
+        if config["qBittorrent"]["inject_mode"] not in QB_INJECT_MODES:
+            problems.append(f"'qBittorrent.inject_mode' must be one of {', '.join(QB_INJECT_MODES)}, not {config['qBittorrent']['inject_mode']!r}")
+        if isinstance(config["qBittorrent"]["inject_batch_size"], int) and config["qBittorrent"]["inject_batch_size"] < 1:
+            problems.append("'qBittorrent.inject_batch_size' must be at least 1")
+    if isinstance(config["trackers"], dict):
+        for tracker_name, tracker_config in config["trackers"].items():
+            if not isinstance(tracker_config, dict):
+                problems.append(f"'trackers.{tracker_name}' must be a table")
+                continue
+            config["trackers"][tracker_name] = check_settings(tracker_config, TRACKER_SETTINGS, f"trackers.{tracker_name}.", problems)
+            for key in ("upload_burst", "upload_concurrency"):
+                if isinstance(config["trackers"][tracker_name][key], int) and config["trackers"][tracker_name][key] < 1:
+                    problems.append(f"'trackers.{tracker_name}.{key}' must be at least 1")
+    return config, problems
+
+# Load configuration from a TOML file, by default config.toml in the 'config' directory
+def load_config(config_file=None):
+    if config_file is None:
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        config_file = os.path.join(base_dir, "config", "config.toml")
     try:
         with open(config_file, "rb") as f:
             config = tomli.load(f)
-        return config
     except Exception as e:
         log_message(f"Error loading config: {e}", level="ERROR")
-        return {}
+        config = {}
+    return validate_config(config)
 
 # Load tracker specific dynamic configurations
 def get_tracker_config(config, tracker_name):
@@ -27,16 +197,181 @@ def get_tracker_config(config, tracker_name):
     return trackers.get(tracker_name, {})
 
 # Logo function
-def inferno_logo():
-    """Display ASCII logo from a text file."""
-    config = load_config()
-    logo_file = config.get("inferno_logo")
+def inferno_logo(logo_file):
+    """Display ASCII logo from a text file. Relative paths are relative to the script directory."""
+    logo_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), logo_file)
 
     try:
-        with open(os.path.join(logo_file), "r") as f:
+        with open(logo_path, "r") as f:
             print(f.read())
     except FileNotFoundError:
-        log_message("Logo file 'config/logo.txt' not found.", level="ERROR")
+        log_message(f"Logo file '{logo_file}' not found.", level="ERROR")
+
+# One album to process and how: trackers, release flags and run options. main builds one from the command line,
+# batch, library and watch mode copy it for every album and the job server builds one per request
+@dataclasses.dataclass
+class AlbumJob:
+    directory: str
+    tracker_names: list
+    source: str
+    bitrate: str = None
+    anonymous: int = 0
+    personal_release: int = 0
+    doubleup: int = 0
+    internal: int = 0
+    refundable: int = 0
+    featured: int = 0
+    sticky: int = 0
+    inject: bool = False
+    dry_run: bool = False
+    force: bool = False
+    no_hash_cache: bool = False
+
+# Per-album log buffer. Set while an album runs in a worker so its lines are printed together
+album_log = contextvars.ContextVar("album_log", default=None)
+print_lock = threading.Lock()
+
+# Process pool for CPU-heavy steps (torrent hashing), set up by batch_process when running with --jobs
+hash_pool = None
+
+# Print a line, or hold it in the current album's log buffer
+def log_output(line):
+    buffer = album_log.get()
+    if buffer is None:
+        with print_lock:
+            print(line)
+    else:
+        buffer.append(line)
+
+# Collect all log lines written inside the block and print them in one go
+@contextlib.contextmanager
+def grouped_log():
+    buffer = []
+    token = album_log.set(buffer)
+    try:
+        yield
+    finally:
+        album_log.reset(token)
+        if buffer:
+            with print_lock:
+                print("\n".join(buffer))
+
+# Submit a call to an executor so it keeps logging into the caller's album buffer and metrics
+def submit_in_context(executor, fn, *args, **kwargs):
+    if thread_profiles is not None:
+        fn = functools.partial(profiled_call, fn)
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+# Start the hash process pool. Workers come from a fork server where there is one, forking a process that
+# already runs threads can leave the child stuck on a lock. Ctrl-C is left to the main process
+def start_hash_pool(workers):
+    global hash_pool
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None
+    hash_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method), initializer=signal.signal, initargs=(signal.SIGINT, signal.SIG_IGN))
+
+def stop_hash_pool():
+    global hash_pool
+    if hash_pool is not None:
+        hash_pool.shutdown(cancel_futures=True)
+        hash_pool = None
+
+# Run a CPU-heavy call on the hash process pool if there is one, otherwise inline
+def run_cpu_bound(fn, *args):
+    if hash_pool is None:
+        return fn(*args)
+    return hash_pool.submit(fn, *args).result()
+
+# Timings and counters of the album being processed. Stages and HTTP calls of the album add to it
+album_metrics = contextvars.ContextVar("album_metrics", default=None)
+metrics_lock = threading.Lock()
+
+# Metrics of the whole run: counters not tied to an album, and the album statuses and stage times behind the
+# run summary. The full report of every album is only kept for --report, see keep_album_reports
+run_metrics = {"stages": {}, "counters": {}, "hosts": {}}
+run_totals = {"albums": 0, "statuses": {}, "stages": {}}
+album_reports = None
+
+# Keep the report of every finished album for the run report. Long library, watch and server runs would
+# otherwise hold one report per album for the life of the process
+def keep_album_reports():
+    global album_reports
+    album_reports = []
+
+# Add a finished album to the run totals, and to the album reports if they are kept
+def record_album_report(report):
+    with metrics_lock:
+        run_totals["albums"] += 1
+        run_totals["statuses"][report["status"]] = run_totals["statuses"].get(report["status"], 0) + 1
+        for name, seconds in report["stages"].items():
+            stage = run_totals["stages"].setdefault(name, {"total": 0.0, "max": 0.0})
+            stage["total"] += seconds
+            stage["max"] = max(stage["max"], seconds)
+        if album_reports is not None:
+            album_reports.append(report)
+
+def new_metrics():
+    return {"stages": {}, "counters": {}, "hosts": {}}
+
+# Add to a counter of the current album and of the run. Counters with a host are kept per upstream host
+def count_metric(name, amount=1, host=None):
+    with metrics_lock:
+        for metrics in (album_metrics.get(), run_metrics):
+            if metrics is None:
+                continue
+            counters = metrics["hosts"].setdefault(host, {}) if host else metrics["counters"]
+            counters[name] = counters.get(name, 0) + amount
+
+# Run one stage of an album and add its wall time to the album's metrics
+def run_stage(name, fn, **kwargs):
+    started = time.monotonic()
+    try:
+        return fn(**kwargs)
+    finally:
+        seconds = time.monotonic() - started
+        metrics = album_metrics.get()
+        if metrics is not None:
+            with metrics_lock:
+                metrics["stages"][name] = metrics["stages"].get(name, 0) + seconds
+
+# Profilers of worker threads while running with --profile. Before Python 3.12 cProfile only sees the thread
+# it was enabled in, so every call handed to a pool gets its own profiler and they are merged at the end
+thread_profiles = None
+
+def profiled_call(fn, *args, **kwargs):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        with metrics_lock:
+            thread_profiles.append(profiler)
+
+# Profile the block with cProfile, save the stats to `profile_path` and print the most expensive calls
+@contextlib.contextmanager
+def profiled_run(profile_path):
+    global thread_profiles
+    if not profile_path:
+        yield
+        return
+
+    if sys.version_info < (3, 12):
+        thread_profiles = []
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        for thread_profile in thread_profiles or ():
+            stats.add(thread_profile)
+        thread_profiles = None
+        stats.dump_stats(profile_path)
+        stats.sort_stats("cumulative").print_stats(25)
+        log_output(f"\n\n+ Profile ({profile_path}) +\n{'━' * 50}")
+        log_output(stream.getvalue().strip())
 
 # Log setup and formatting
 def log_message(message, level="SUCCESS", dry_run=False):
@@ -48,42 +383,288 @@ def log_message(message, level="SUCCESS", dry_run=False):
         "DRY RUN": "[DRY RUN] -"
     }
     prefix = levels.get(level, "[INFO]")
-    print(f"{prefix} {message}")
+    log_output(f"{prefix} {message}")
+
+# Keep mediainfo output for 90 days, keyed by the file's path, size and mtime
+MEDIAINFO_CACHE_TTL = 90 * 86400
+
+def media_info_cache_key(file_path, output_format):
+    stat = os.stat(file_path)
+    return f"{output_format}:{file_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+# Run mediainfo on a file, reusing the cached output if the file did not change
+def run_mediainfo(file_path, output_format="text", cache_path=None):
+    key = media_info_cache_key(file_path, output_format) if cache_path else None
+    if key:
+        cached = cache_get(cache_path, "mediainfo", key)
+        if cached is not None:
+            return cached
+
+    command = ["mediainfo", file_path] if output_format == "text" else ["mediainfo", f"--Output={output_format.upper()}", file_path]
+    count_metric("mediainfo_runs")
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"mediainfo exited with {result.returncode}")
+
+    if key:
+        cache_set(cache_path, "mediainfo", key, result.stdout, MEDIAINFO_CACHE_TTL)
+    return result.stdout
 
 # Extract media info from first file using mediainfo
-def get_media_info(file_path):
+def get_media_info(file_path, cache_path=None):
     try:
-        result = subprocess.run(["mediainfo", file_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        return result.stdout
+        return run_mediainfo(file_path, "text", cache_path)
     except Exception as e:
         log_message(f"Error extracting media info from {file_path}: {e}", level="ERROR")
         return None
 
-# Clear the contents of the output directory if the setting is enabled.
+# Structured mediainfo output (mediainfo --Output=JSON) as a dict
+def get_media_info_json(file_path, cache_path=None):
+    try:
+        return json.loads(run_mediainfo(file_path, "json", cache_path))
+    except Exception as e:
+        log_message(f"Error extracting media info JSON from {file_path}: {e}", level="ERROR")
+        return None
+
+# Pick the commonly reused fields of the first audio stream out of mediainfo's JSON
+def media_info_audio_fields(media_info_json):
+    tracks = (media_info_json or {}).get("media", {}).get("track", [])
+    audio = next((track for track in tracks if track.get("@type") == "Audio"), {})
+    return {
+        "format": audio.get("Format"),
+        "bit_depth": audio.get("BitDepth"),
+        "sample_rate": audio.get("SamplingRate"),
+        "channels": audio.get("Channels"),
+        "bitrate": audio.get("BitRate"),
+        "bitrate_mode": audio.get("BitRate_Mode"),
+        "compression_mode": audio.get("Compression_Mode"),
+    }
+
+# Persistent caches live in this folder inside the output directory unless 'cache_dir' is set
+CACHE_DIRNAME = ".inferno"
+
+def get_cache_dir(config, output_base):
+    return config.get("cache_dir") or os.path.join(output_base, CACHE_DIRNAME)
+
+# Open (and create) an SQLite cache database. WAL lets parallel jobs and hash processes share it
+def open_cache_db(db_path):
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    return connection
+
+# Read a value from the key/value lookup cache, None when missing or expired
+def cache_get(db_path, namespace, key):
+    with contextlib.closing(open_cache_db(db_path)) as db, db:
+        db.execute("CREATE TABLE IF NOT EXISTS lookups (namespace TEXT, key TEXT, value TEXT, expires REAL, PRIMARY KEY (namespace, key))")
+        row = db.execute("SELECT value FROM lookups WHERE namespace = ? AND key = ? AND expires > ?", (namespace, key, time.time())).fetchone()
+    return json.loads(row[0]) if row else None
+
+# Store a JSON serializable value in the lookup cache for ttl seconds
+def cache_set(db_path, namespace, key, value, ttl):
+    with contextlib.closing(open_cache_db(db_path)) as db, db:
+        db.execute("CREATE TABLE IF NOT EXISTS lookups (namespace TEXT, key TEXT, value TEXT, expires REAL, PRIMARY KEY (namespace, key))")
+        db.execute("DELETE FROM lookups WHERE expires <= ?", (time.time(),))
+        db.execute("INSERT OR REPLACE INTO lookups (namespace, key, value, expires) VALUES (?, ?, ?, ?)", (namespace, key, json.dumps(value), time.time() + ttl))
+
+# Thread-safe token bucket: `rate` requests per second with bursts of up to `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Block until a token is available and take it
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Upload queue of one tracker. An upload waits for a free slot (concurrency), a token of the bucket (rate per
+# second, bursts of `burst`, 0 = no limit) and the end of any pause the tracker asked for with 429/Retry-After.
+# The pause holds back every album uploading to the tracker, not only the one that was throttled
+class UploadQueue:
+    def __init__(self, rate, burst=1, concurrency=2):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    # Hold back all uploads to this tracker for `seconds`
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    @contextlib.contextmanager
+    def slot(self):
+        started = time.monotonic()
+        with self.slots:
+            if self.bucket:
+                self.bucket.acquire()
+            # Checked last, a pause can start while waiting for the token
+            while True:
+                with self.lock:
+                    remaining = self.paused_until - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(remaining)
+            count_metric("upload_queue_seconds", time.monotonic() - started)
+            yield
+
+# Upload queues by tracker name, created from the tracker's settings on first use
+upload_queues = {}
+upload_queues_lock = threading.Lock()
+
+def upload_queue(config, tracker_name):
+    with upload_queues_lock:
+        queue = upload_queues.get(tracker_name)
+        if queue is None:
+            tracker_config = get_tracker_config(config, tracker_name)
+            queue = UploadQueue(tracker_config["upload_rate"], tracker_config["upload_burst"], tracker_config["upload_concurrency"])
+            upload_queues[tracker_name] = queue
+    return queue
+
+# Clear the contents of the output directory if the setting is enabled. The cache folder is kept.
 def clear_output_directory(output_dir):
     if not os.path.exists(output_dir):
         log_message(f"Output directory '{output_dir}' does not exist. Skipping clearing.", level="INFO")
         return
 
     try:
-        for root, dirs, files in os.walk(output_dir):
-            for file in files:
-                os.remove(os.path.join(root, file))
-            for dir in dirs:
-                shutil.rmtree(os.path.join(root, dir))
+        for entry in os.scandir(output_dir):
+            if entry.name == CACHE_DIRNAME:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.remove(entry.path)
         log_message(f"Cleared contents of output directory: {output_dir}", level="SUCCESS")
     except Exception as e:
         log_message(f"Error while clearing output directory '{output_dir}': {e}", level="ERROR")
 
-# Inject torrent URL in qBittorrent with options
-def qb_inject(config, torrent_url, directory, dry_run=False):
-    if dry_run:
-        log_message(f"Simulating torrent injection to qBittorrent with URL: {torrent_url}", level="INFO", dry_run=True)
-        return
-    
+# HTTP client settings, overridden by the [http] table in config.toml
+http_settings = {
+    "connect_timeout": 10,
+    "read_timeout": 120,
+    "retries": 3,
+    "backoff_factor": 1.0,
+    "max_retry_after": 300,
+    "pool_size": 16,
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Pooled sessions, one per scheme and host, so connections and TLS sessions are reused
+http_sessions = {}
+http_sessions_lock = threading.Lock()
+
+def setup_http(config):
+    http_settings.update(config["http"])
+
+def http_session(url):
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with http_sessions_lock:
+        session = http_sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=http_settings["pool_size"])
+            session.mount(f"{parts.scheme}://", adapter)
+            http_sessions[key] = session
+    return session
+
+# Seconds to wait from a Retry-After header (delay in seconds or an HTTP date), None if missing
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# True when a request failed before it reached the server: the connection was refused or timed out
+def connect_failed(error):
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, requests.packages.urllib3.exceptions.NewConnectionError)
+
+# Send a request on the pooled session of the URL's host. Idempotent calls (GET etc. or idempotent=True) are
+# retried on connection errors and 429/5xx replies with exponential backoff, honoring Retry-After. Other calls
+# are only retried when the connection could not be made, so nothing was sent yet
+def http_request(method, url, idempotent=None, **kwargs):
+    if idempotent is None:
+        idempotent = method.upper() in ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+    kwargs.setdefault("timeout", (http_settings["connect_timeout"], http_settings["read_timeout"]))
+    attempts = 1 + http_settings["retries"]
+    session = http_session(url)
+    host = urlsplit(url).netloc
+
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+        started = time.monotonic()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            count_metric("requests", host=host)
+            count_metric("errors", host=host)
+            count_metric("seconds", time.monotonic() - started, host=host)
+            if last_attempt or not (idempotent or connect_failed(e)):
+                raise
+            delay = None
+        else:
+            count_metric("requests", host=host)
+            count_metric("seconds", time.monotonic() - started, host=host)
+            if response.status_code in RETRY_STATUSES:
+                count_metric("errors", host=host)
+            if response.status_code not in RETRY_STATUSES or not idempotent or last_attempt:
+                return response
+            delay = retry_after_seconds(response)
+            response.close()
+        if delay is None:
+            delay = http_settings["backoff_factor"] * 2 ** attempt
+        count_metric("retries", host=host)
+        time.sleep(min(delay, http_settings["max_retry_after"]))
+
+# qBittorrent hosts we hold a login cookie for. The cookie lives in the host's pooled session
+qb_authenticated = set()
+qb_auth_lock = threading.Lock()
+
+# Call the qBittorrent Web API, logging in only when there is no valid cookie yet
+def qb_request(config, path, **kwargs):
     qb_url = config['qBittorrent']['qb_url']
-    username = config['qBittorrent']['username']
-    password = config['qBittorrent']['password']
+    for attempt in range(2):
+        with qb_auth_lock:
+            if qb_url not in qb_authenticated:
+                login_data = {'username': config['qBittorrent']['username'], 'password': config['qBittorrent']['password']}
+                login_response = http_request("POST", f'{qb_url}/api/v2/auth/login', data=login_data, idempotent=True)
+                if login_response.status_code != 200 or login_response.text.strip() == "Fails.":
+                    raise RuntimeError(f"qBittorrent login failed ({login_response.status_code}: {login_response.text.strip()})")
+                qb_authenticated.add(qb_url)
+
+        response = http_request("POST", f'{qb_url}{path}', idempotent=True, **kwargs)
+        # 403 means the cookie expired, log in again once
+        if response.status_code != 403:
+            return response
+        with qb_auth_lock:
+            qb_authenticated.discard(qb_url)
+    return response
+
+# Options of every torrent added to qBittorrent. The save path is the album's parent directory (ex. /downloads/music/artist/)
+def qb_add_options(config, directory):
     category = config['qBittorrent']['category']
     tags = config['qBittorrent']['tags']
     paused = config['qBittorrent']['paused']
@@ -95,67 +676,450 @@ def qb_inject(config, torrent_url, directory, dry_run=False):
     # Set save path to album parent directory (ex. /downloads/music/artist/). Comment this if using config.toml for path
     save_path = os.path.dirname(directory)
 
-    # Create a session to maintain cookies
-    session = requests.Session()
-
-    # Perform the login
-    login_data = {'username': username, 'password': password}
-    login_response = session.post(f'{qb_url}/api/v2/auth/login', data=login_data)
-
-    # Add the torrent from the URL
-    torrent_data = {
-        'urls': torrent_url,
+    return {
         'savepath': save_path,
         'category': category,
         'tags': tags,
         'paused': paused
     }
 
-    add_torrent_response = session.post(f'{qb_url}/api/v2/torrents/add', data=torrent_data)
+# Inject torrent URL in qBittorrent with options. Returns True when qBittorrent accepted it
+def qb_inject(config, torrent_url, directory, dry_run=False):
+    if dry_run:
+        log_message(f"Simulating torrent injection to qBittorrent with URL: {torrent_url}", level="INFO", dry_run=True)
+        return False
+
+    # Add the torrent from the URL
+    torrent_data = {'urls': torrent_url, **qb_add_options(config, directory)}
+
+    try:
+        add_torrent_response = qb_request(config, '/api/v2/torrents/add', data=torrent_data)
+    except Exception as e:
+        log_message(f"Failed to add torrent to qBittorrent: {e}", level="ERROR")
+        return False
 
     # Check if the torrent was successfully added
     if add_torrent_response.status_code == 200:
         log_message(f"Torrent added to qBittorrent", level="SUCCESS")
-    else:
-        log_message(f"Failed to add torrent! Status code: {add_torrent_response.status_code}, Response: {add_torrent_response.text}", level="ERROR")
+        return True
+    log_message(f"Failed to add torrent! Status code: {add_torrent_response.status_code}, Response: {add_torrent_response.text}", level="ERROR")
+    return False
+
+# The .torrent to hand to qBittorrent. UNIT3D rewrites the source field of uploads, so our own file only has the
+# tracker's info hash when torrent_source is set to what the tracker writes. Otherwise the tracker's copy is fetched
+def inject_torrent_bytes(config, tracker_name, torrent_file, torrent_url):
+    if get_tracker_config(config, tracker_name).get("torrent_source"):
+        with open(torrent_file, "rb") as f:
+            return f.read()
+    response = http_request("GET", torrent_url)
+    response.raise_for_status()
+    if not response.content.startswith(b"d"):
+        raise ValueError(f"{torrent_url} did not return a .torrent file")
+    return response.content
+
+# Add .torrent files to qBittorrent with the hash check skipped, the data was hashed or verified by this run.
+# `items` are dicts with the album directory, file name and bytes, the ledger and tracker, and optionally the
+# add options (default qb_add_options). One API call per set of options
+def qb_add_torrent_files(config, items):
+    by_options = {}
+    for item in items:
+        options = item.get("options") or qb_add_options(config, item["directory"])
+        by_options.setdefault(tuple(options.items()), []).append(item)
+
+    for options, batch in by_options.items():
+        names = ", ".join(os.path.basename(item["directory"]) for item in batch)
+        torrent_data = {**dict(options), 'skip_checking': 'true'}
+        torrent_files = [('torrents', (item["name"], item["data"], 'application/x-bittorrent')) for item in batch]
+        try:
+            add_torrent_response = qb_request(config, '/api/v2/torrents/add', data=torrent_data, files=torrent_files)
+        except Exception as e:
+            log_message(f"Failed to add torrents to qBittorrent ({names}): {e}", level="ERROR")
+            continue
+
+        # qBittorrent answers 200 "Fails." when it added none of them
+        if add_torrent_response.status_code != 200 or add_torrent_response.text.strip() == "Fails.":
+            log_message(f"Failed to add torrents ({names})! Status code: {add_torrent_response.status_code}, Response: {add_torrent_response.text}", level="ERROR")
+            continue
+        for item in batch:
+            record_ledger(item["ledger"], item["tracker_name"], injected=1)
+        count_metric("torrents_injected", len(batch))
+        if len(batch) == 1:
+            log_message(f"Torrent added to qBittorrent (hash check skipped): {names}", level="SUCCESS")
+        else:
+            log_message(f"{len(batch)} torrents added to qBittorrent (hash check skipped): {names}", level="SUCCESS")
+
+# Torrents waiting to be added to qBittorrent in one call, set up by process_albums in batch and library mode
+qb_queue = None
+qb_queue_lock = threading.Lock()
+
+def start_inject_queue():
+    global qb_queue
+    qb_queue = []
+
+# Add the queued torrents to qBittorrent and stop queueing
+def flush_inject_queue(config):
+    global qb_queue
+    with qb_queue_lock:
+        items, qb_queue = qb_queue or [], None
+    if items:
+        qb_add_torrent_files(config, items)
+
+# Inject the local .torrent of an uploaded album. In batch mode it waits in qb_queue until inject_batch_size
+# torrents are there, otherwise it is added right away. Falls back to the URL when the file cannot be read
+def inject_torrent_file(config, tracker_name, torrent_file, torrent_url, directory, ledger):
+    try:
+        data = inject_torrent_bytes(config, tracker_name, torrent_file, torrent_url)
+    except Exception as e:
+        log_message(f"Could not read the torrent for qBittorrent ({tracker_name}), adding it by URL: {e}", level="WARNING")
+        if qb_inject(config, torrent_url, directory):
+            record_ledger(ledger, tracker_name, injected=1)
+        return
+
+    item = {"directory": directory, "name": os.path.basename(torrent_file), "data": data, "ledger": ledger, "tracker_name": tracker_name}
+    with qb_queue_lock:
+        if qb_queue is not None:
+            qb_queue.append(item)
+            if len(qb_queue) < config['qBittorrent']['inject_batch_size']:
+                log_message(f"Torrent queued for qBittorrent ({tracker_name})", level="INFO")
+                return
+            items = qb_queue[:]
+            qb_queue.clear()
+        else:
+            items = [item]
+    qb_add_torrent_files(config, items)
+
+# Shared MusicBrainz rate limit for all album threads (1 request per second by default)
+musicbrainz_bucket = TokenBucket(1.0)
+
+# MusicBrainz user agent from config, applied when musicbrainzngs is first imported
+musicbrainz_user_agent = {}
 
 # Configure the MusicBrainz client using values from config
 def setup_musicbrainz(config):
-    user_agent = config.get("musicbrainz", {})
-    name = user_agent.get("name")
-    version = user_agent.get("version")
-    email = user_agent.get("email")
-    musicbrainzngs.set_useragent(name, version, email)
+    user_agent = config.get("musicbrainz_user_agent") or config.get("musicbrainz", {})
+    musicbrainz_user_agent.update(name=user_agent.get("name"), version=user_agent.get("version"), email=user_agent.get("email"))
+    musicbrainz_bucket.rate = config["musicbrainz_rate_limit"]
+    musicbrainz_client.cache_clear()
+
+# musicbrainzngs, imported and configured on the first lookup
+@functools.cache
+def musicbrainz_client():
+    import musicbrainzngs
+    musicbrainzngs.set_useragent(musicbrainz_user_agent.get("name"), musicbrainz_user_agent.get("version"), musicbrainz_user_agent.get("email"))
+
+    # Requests are rate limited by musicbrainz_bucket instead of musicbrainzngs
+    musicbrainzngs.set_rate_limit(False)
+    return musicbrainzngs
+
+# Lowercase, Unicode normalized and whitespace collapsed, so tag spelling variants share a cache entry
+def normalize_lookup_key(*parts):
+    return "\x1f".join(" ".join(unicodedata.normalize("NFKC", str(part)).casefold().split()) for part in parts)
+
+# First image of a release in the Cover Art Archive, or None
+def release_cover_image(release_id):
+    count_metric("cover_art_archive_requests")
+    musicbrainzngs = musicbrainz_client()
+    try:
+        cover_art = musicbrainzngs.get_image_list(release_id)
+    except musicbrainzngs.WebServiceError:
+        return None
+    if cover_art.get("images"):
+        return cover_art["images"][0].get("image")
+    return None
 
-# Fetch album information using MusicBrainz
-def fetch_album_info(directory, config):
-    file_types = config.get("file_types")
-    all_files = []
-    for root, _, files in os.walk(directory):
-        all_files.extend(os.path.join(root, f) for f in files if any(f.lower().endswith(ext) for ext in file_types))
+# Probe the Cover Art Archive for several releases at the same time. The first release in search order
+# with an image wins, probes that are still queued after that are cancelled
+def probe_cover_art(release_ids, workers=4):
+    if not release_ids:
+        return None, None
+    pool = ThreadPoolExecutor(max_workers=min(workers, len(release_ids)))
+    try:
+        futures = [submit_in_context(pool, release_cover_image, release_id) for release_id in release_ids]
+        for release_id, future in zip(release_ids, futures):
+            cover_url = future.result()
+            if cover_url:
+                return release_id, cover_url
+        return None, None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+# Look up the cover art URL for an album on MusicBrainz, cached by normalized artist and album
+def lookup_cover_url(artist, album, config, cache_path=None):
+    key = normalize_lookup_key(artist, album)
+    if cache_path:
+        cached = cache_get(cache_path, "musicbrainz", key)
+        if cached is not None:
+            return cached.get("cover_url")
+
+    # The offline index knows which releases have a front cover, only those are probed. On a miss the web
+    # service is searched at its rate limit
+    index_path = config.get("musicbrainz_index")
+    releases = musicbrainz_index_releases(index_path, artist, album) if index_path and os.path.exists(index_path) else None
+    if releases is not None:
+        count_metric("musicbrainz_index_hits")
+        release_ids = [release_id for release_id, front in releases if front]
+    else:
+        if index_path and os.path.exists(index_path):
+            count_metric("musicbrainz_index_misses")
+        musicbrainzngs = musicbrainz_client()
+        try:
+            musicbrainz_bucket.acquire()
+            count_metric("musicbrainz_requests")
+            result = musicbrainzngs.search_releases(artist=artist, release=album, limit=10)
+        except musicbrainzngs.WebServiceError:
+            count_metric("musicbrainz_errors")
+            # Not cached, the next run tries again
+            return None
+        release_ids = [release["id"] for release in result.get("release-list", [])]
+
+    release_id, cover_url = probe_cover_art(release_ids, config["cover_art_workers"])
+
+    if cache_path:
+        ttl = config["musicbrainz_cache_days"] * 86400
+        # Albums without cover art are looked up again after a day, the art may have been added since
+        cache_set(cache_path, "musicbrainz", key, {"release_id": release_id, "cover_url": cover_url}, ttl if cover_url else min(ttl, 86400))
+    return cover_url
+
+# Offline MusicBrainz index, built with --build-mb-index from the release file of a MusicBrainz JSON dump.
+# Defaults to musicbrainz.sqlite in the cache folder
+MUSICBRAINZ_INDEX_FILENAME = "musicbrainz.sqlite"
+MUSICBRAINZ_INDEX_BATCH = 10000
+
+# Lines of the release file of a MusicBrainz JSON dump: release.tar.xz as downloaded, or the mbdump/release
+# file extracted from it (plain, .xz, .gz or .bz2). One JSON document per release
+def musicbrainz_dump_lines(dump_path):
+    import tarfile
+    if tarfile.is_tarfile(dump_path):
+        # Streamed, the archive is far too large to seek around in
+        with tarfile.open(dump_path, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and os.path.basename(member.name) == "release":
+                    yield from archive.extractfile(member)
+                    return
+        raise ValueError(f"No mbdump/release file in {dump_path}")
+
+    import bz2, gzip, lzma
+    opener = {".xz": lzma.open, ".gz": gzip.open, ".bz2": bz2.open}.get(os.path.splitext(dump_path)[1].lower(), open)
+    with opener(dump_path, "rb") as f:
+        yield from f
+
+# Index row of a dump release: MBID, artist credit and title (normalized like lookup keys), front cover flag
+def musicbrainz_dump_release(line):
+    release = json.loads(line)
+    artist = "".join(credit.get("name", "") + credit.get("joinphrase", "") for credit in release.get("artist-credit", []))
+    front = (release.get("cover-art-archive") or {}).get("front", False)
+    return release["id"], normalize_lookup_key(artist), normalize_lookup_key(release["title"]), 1 if front else 0
+
+# Build the offline index into a new file and swap it in when complete, a running lookup keeps the old one
+def build_musicbrainz_index(dump_path, index_path):
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    building_path = index_path + ".building"
+    if os.path.exists(building_path):
+        os.remove(building_path)
+
+    started = time.monotonic()
+    count = skipped = 0
+    with contextlib.closing(sqlite3.connect(building_path)) as db:
+        db.execute("PRAGMA journal_mode=OFF")
+        db.execute("PRAGMA synchronous=OFF")
+        # Names are stored normalized, so matches can be checked exactly. No column sizes, nothing is ranked
+        db.execute("CREATE VIRTUAL TABLE releases USING fts5(artist, title, release_id UNINDEXED, front UNINDEXED, tokenize = 'unicode61 remove_diacritics 2', columnsize = 0)")
+        db.execute("CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT)")
+
+        batch = []
+        for line in musicbrainz_dump_lines(dump_path):
+            try:
+                batch.append(musicbrainz_dump_release(line))
+            except (ValueError, KeyError, TypeError, AttributeError):
+                skipped += 1
+                continue
+            if len(batch) >= MUSICBRAINZ_INDEX_BATCH:
+                db.executemany("INSERT INTO releases (release_id, artist, title, front) VALUES (?, ?, ?, ?)", batch)
+                count += len(batch)
+                batch.clear()
+                if count % (100 * MUSICBRAINZ_INDEX_BATCH) == 0:
+                    log_message(f"MusicBrainz Index: {count:,} releases ({time.monotonic() - started:.0f}s)", level="INFO")
+        db.executemany("INSERT INTO releases (release_id, artist, title, front) VALUES (?, ?, ?, ?)", batch)
+        count += len(batch)
+
+        db.execute("INSERT INTO releases (releases) VALUES ('optimize')")
+        db.executemany("INSERT INTO info (key, value) VALUES (?, ?)", [
+            ("dump", os.path.basename(dump_path)),
+            ("built", datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")),
+            ("releases", str(count)),
+        ])
+        db.commit()
+        db.execute("VACUUM")
+    os.replace(building_path, index_path)
+
+    size = os.path.getsize(index_path) / 1024 / 1024
+    log_message(f"MusicBrainz Index: {count:,} releases in {index_path} ({size:.1f} MiB, {time.monotonic() - started:.0f}s)", level="SUCCESS")
+    if skipped:
+        log_message(f"MusicBrainz Index: skipped {skipped:,} unreadable lines", level="WARNING")
+
+# FTS5 phrase of a normalized name
+def fts_phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+# Releases of an artist and album in the offline index as [(release_id, has_front_cover)]. Only releases whose
+# normalized artist credit and title are equal to the tags count, None when there are none
+def musicbrainz_index_releases(index_path, artist, album):
+    artist_key, album_key = normalize_lookup_key(artist), normalize_lookup_key(album)
+    query = f"artist : {fts_phrase(artist_key)} AND title : {fts_phrase(album_key)}"
+    try:
+        with contextlib.closing(sqlite3.connect(f"{pathlib.Path(os.path.abspath(index_path)).as_uri()}?mode=ro", uri=True)) as db:
+            rows = db.execute("SELECT release_id, artist, title, front FROM releases WHERE releases MATCH ? LIMIT 500", (query,)).fetchall()
+    except sqlite3.Error as e:
+        # Names without any letters or digits are no valid query, the web service is asked instead
+        if "syntax error" not in str(e):
+            log_message(f"MusicBrainz index: {e}", level="WARNING")
+        return None
+    releases = [(release_id, bool(front)) for release_id, release_artist, title, front in rows if release_artist == artist_key and title == album_key]
+    return releases or None
+
+# Everything the pipeline needs to know about the files of an album, gathered in one directory walk
+class AlbumIndex:
+    __slots__ = ("directory", "audio_files", "cover_candidates", "file_sizes", "file_mtimes", "total_size")
+
+    def __init__(self, directory, audio_files, cover_candidates, file_sizes, file_mtimes):
+        self.directory = directory
+        self.audio_files = audio_files
+        self.cover_candidates = cover_candidates
+        self.file_sizes = file_sizes
+        self.file_mtimes = file_mtimes
+        self.total_size = sum(file_sizes.values())
+
+# Walk an album directory once with os.scandir. Audio files come back sorted, the other files
+# (possible cover art) in walk order, and every file's size and mtime is recorded. Symlinked directories are
+# followed for the torrent's files, as torf does, unless they point back to a directory above them. Their files
+# are left out of the audio files and cover candidates, like os.walk did before
+def scan_album(directory, file_types=()):
+    extensions = tuple(ext.lower() for ext in file_types)
+    audio_files = []
+    cover_candidates = []
+    file_sizes = {}
+    file_mtimes = {}
+    root = os.path.realpath(directory)
+    # (path, real paths of the directory and the ones above it, below a symlinked directory)
+    pending = [(directory, (root,), False)]
+
+    while pending:
+        path, parents, linked = pending.pop()
+        subdirs = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if entry.is_symlink():
+                        real = os.path.realpath(entry.path)
+                        if real not in parents:
+                            subdirs.append((entry.path, parents + (real,), True))
+                    else:
+                        subdirs.append((entry.path, parents + (os.path.join(parents[-1], entry.name),), linked))
+                    continue
+                stat = entry.stat()
+                file_sizes[entry.path] = stat.st_size
+                file_mtimes[entry.path] = stat.st_mtime_ns
+                if linked:
+                    continue
+                if entry.name.lower().endswith(extensions):
+                    audio_files.append(entry.path)
+                else:
+                    cover_candidates.append(entry.path)
+        pending.extend(reversed(subdirs))
+
+    return AlbumIndex(directory, sorted(audio_files), cover_candidates, file_sizes, file_mtimes)
+
+# Tags and stream info of one audio file, normalized across FLAC, MP3 and M4A
+class TrackInfo:
+    __slots__ = ("path", "artist", "album", "date", "title", "disc", "track", "length", "bitrate", "sample_rate", "bits_per_sample", "channels", "bitrate_mode", "encoder_settings", "codec")
+
+    def __init__(self, path, artist, album, date, title, disc, track, length, bitrate, sample_rate, bits_per_sample, channels, bitrate_mode=None, encoder_settings="", codec=""):
+        self.path = path
+        self.artist = artist
+        self.album = album
+        self.date = date
+        self.title = title
+        self.disc = disc
+        self.track = track
+        self.length = length
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.bits_per_sample = bits_per_sample
+        self.channels = channels
+        self.bitrate_mode = bitrate_mode
+        self.encoder_settings = encoder_settings
+        self.codec = codec
+
+# mutagen's MP3 bitrate modes by value, MP3s without a Xing/LAME header are UNKNOWN (0)
+MP3_BITRATE_MODES = {1: "CBR", 2: "VBR", 3: "ABR"}
+
+# Tracks already read in this process, keyed by (path, size, mtime). Shared by every stage and album
+track_cache = OrderedDict()
+track_cache_lock = threading.Lock()
+TRACK_CACHE_SIZE = 20000
+
+# Read one audio file's tags and stream info. mutagen's "easy" mode gives FLAC, MP3 and M4A the same tag keys
+def read_track(path):
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    with track_cache_lock:
+        if key in track_cache:
+            track_cache.move_to_end(key)
+            return track_cache[key]
+
+    metadata = mutagen.File(path, easy=True)
+    if metadata is None:
+        raise ValueError(f"Unsupported audio file: {path}")
+    tags = metadata.tags or {}
+
+    def tag(name, default=None):
+        values = tags.get(name)
+        return str(values[0]) if values else default
+
+    # "1/2" style numbers become "1"
+    disc = (tag("discnumber") or "1").split("/")[0].strip() or "1"
+    track_number = (tag("tracknumber") or "").split("/")[0].strip()
+    info = metadata.info
+    track = TrackInfo(
+        path,
+        tag("artist", "Unknown Artist"),
+        tag("album", "Unknown Album"),
+        tag("date", "Unknown Date"),
+        tag("title", os.path.splitext(os.path.basename(path))[0]),
+        disc,
+        track_number,
+        info.length,
+        getattr(info, "bitrate", 0),
+        getattr(info, "sample_rate", 0),
+        getattr(info, "bits_per_sample", 0),
+        getattr(info, "channels", 0),
+        MP3_BITRATE_MODES.get(int(getattr(info, "bitrate_mode", 0))),
+        getattr(info, "encoder_settings", "") or "",
+        getattr(info, "codec", "") or "",
+    )
+
+    with track_cache_lock:
+        track_cache[key] = track
+        if len(track_cache) > TRACK_CACHE_SIZE:
+            track_cache.popitem(last=False)
+    return track
 
-    files = sorted(all_files)
+# Read all tracks of an album on a thread pool, in the order of `files`
+def read_tracks(files, workers=8):
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(files)))) as pool:
+        return list(pool.map(read_track, files))
+
+# Read the tags of all tracks in an album. Artist, album and year come from the first track
+def read_album_tags(album_index, config):
+    files = album_index.audio_files
 
     if not files:
         raise FileNotFoundError("No supported audio files found in the specified directory.")
 
-    metadata = File(files[0])
-    file_extension = files[0].lower().split(".")[-1]
-    # MP3 metadata
-    if file_extension == "mp3":
-        artist = metadata.get("TPE1", ["Unknown Artist"])[0]
-        album = metadata.get("TALB", ["Unknown Album"])[0]
-        year = metadata.get("TDRC", ["Unknown Date"])[0]
-    # FLAC metadata
-    elif file_extension == "flac":
-        artist = metadata.get("artist", ["Unknown Artist"])[0]
-        album = metadata.get("album", ["Unknown Album"])[0]
-        year = metadata.get("date", ["Unknown Date"])[0]
-    # M4A metadata
-    elif file_extension == "m4a":
-        artist = metadata.get("\xa9ART", ["Unknown Artist"])[0]
-        album = metadata.get("\xa9alb", ["Unknown Album"])[0]
-        year = metadata.get("\xa9day", ["Unknown Date"])[0]
+    tracks = read_tracks(files, config["tag_workers"])
+    artist = tracks[0].artist
+    album = tracks[0].album
+    year = tracks[0].date
 
     # If date tag contains full date, convert to 4 digit year
     try:
@@ -167,37 +1131,83 @@ def fetch_album_info(directory, config):
     except (TypeError, ValueError):
         year = "Unknown Year"
 
-    release_id = None
-    cover_url = None
+    return artist, album, year, files[0].split('.')[-1].upper(), tracks
+
+# Lossless formats by file extension. M4A is lossless when its codec is ALAC
+LOSSLESS_EXTENSIONS = {".flac", ".wav", ".aif", ".aiff", ".wv", ".ape"}
+# LAME presets and the VBR quality (or CBR bitrate) they stand for
+LAME_PRESETS = {"--preset extreme": "V0", "--preset standard": "V2", "--preset medium": "V5", "--preset insane": "320"}
+
+# Encoding label of one track: Lossless (24bit Lossless above 16 bit), V0-V9 for LAME VBR, the bitrate in kbps
+# for CBR and the LAME target for ABR (the measured average differs per track). AAC is labelled per album. None
+# when the files do not tell: VBR or ABR without LAME settings (other encoders), ABR targets of 255+ kbps, which
+# LAME does not store exactly, and MP3s without a Xing/LAME header, whose mode is unknown
+def track_encoding(track):
+    if os.path.splitext(track.path)[1].lower() in LOSSLESS_EXTENSIONS or track.codec == "alac":
+        return f"{track.bits_per_sample}bit Lossless" if track.bits_per_sample > 16 else "Lossless"
+    if track.codec.startswith("mp4a"):
+        return "AAC"
+    if track.bitrate_mode == "VBR":
+        quality = re.search(r"-V\s*(\d)", track.encoder_settings)
+        return f"V{quality.group(1)}" if quality else LAME_PRESETS.get(track.encoder_settings.strip())
+    if track.bitrate_mode == "ABR":
+        target = re.search(r"(?:--abr|--preset|--alt-preset)\s+(\d+)(\+?)", track.encoder_settings)
+        return target.group(1) if target and not target.group(2) else None
+    if track.bitrate_mode == "CBR":
+        return str(round(track.bitrate / 1000))
+    return None
+
+# Stream info of all tracks in one pass: the album's file type and encoding label (None when the tracks
+# disagree or some of them have no label), its audio properties and what makes it inconsistent. `measured` is
+# set when the label is a measured average (AAC) rather than the encoder's setting
+def album_audio_summary(tracks):
+    def distinct(values):
+        return sorted(set(values), key=str)
+
+    file_types = distinct(os.path.splitext(track.path)[1].lstrip(".").upper() for track in tracks)
+    labels = [track_encoding(track) for track in tracks]
+    # Tracks without a label can not disagree with the others
+    encodings = distinct(label for label in labels if label is not None)
+    problems = []
+    if len(file_types) > 1:
+        problems.append(f"mixed file types: {', '.join(file_types)}")
+    if len(encodings) > 1:
+        problems.append(f"mixed encodings: {', '.join(encodings)}")
+
+    properties = {}
+    for name, attribute, unit in (("sample rates", "sample_rate", "Hz"), ("bit depths", "bits_per_sample", "bit"), ("channel counts", "channels", "ch")):
+        # 0 is unknown, MP3 has no bit depth
+        values = distinct(getattr(track, attribute) for track in tracks if getattr(track, attribute))
+        properties[attribute] = values[0] if len(values) == 1 else None
+        if len(values) > 1:
+            problems.append(f"mixed {name}: {', '.join(f'{value}{unit}' for value in values)}")
+
+    encoding = encodings[0] if len(encodings) == 1 and None not in labels else None
+    # AAC bitrates vary a little between tracks, the album gets their average
+    measured = encoding == "AAC"
+    if measured:
+        encoding = str(round(sum(track.bitrate for track in tracks) / len(tracks) / 1000))
+    return {"file_type": file_types[0] if len(file_types) == 1 else None, "encoding": encoding, "measured": measured, **properties, "problems": problems}
+
+# Fetch album information using MusicBrainz
+def fetch_album_info(album_index, config, cache_path=None):
+    artist, album, year, file_type, tracks = read_album_tags(album_index, config)
 
     # Search for the release in MusicBrainz
-    try:
-        result = musicbrainzngs.search_releases(artist=artist, release=album, limit=10)
-        for release in result.get("release-list", []):
-            release_id = release["id"]
-            try:
-                cover_art = musicbrainzngs.get_image_list(release_id)
-                if cover_art.get("images"):
-                    cover_url = cover_art["images"][0].get("image")
-                    break
-            except musicbrainzngs.WebServiceError:
-                continue
-    except musicbrainzngs.WebServiceError as e:
-        pass
+    cover_url = lookup_cover_url(artist, album, config, cache_path)
 
-    return artist, album, year, cover_url, files[0].split('.')[-1].upper(), files
+    return artist, album, year, cover_url, file_type, tracks
 
 # Check for the existence of cover art based on config
-def local_cover_art(directory, valid_cover_art, artist, album):
+def local_cover_art(album_index, valid_cover_art, artist, album):
     # Process valid_cover_art to replace placeholders
-    valid_cover_art_processed = [
-        name.format(artist=artist, album=album) for name in valid_cover_art
-    ]
-    
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.lower() in [name.lower() for name in valid_cover_art_processed]:
-                return os.path.join(root, file)
+    valid_cover_art_processed = {
+        name.format(artist=artist, album=album).lower() for name in valid_cover_art
+    }
+
+    for path in album_index.cover_candidates:
+        if os.path.basename(path).lower() in valid_cover_art_processed:
+            return path
     return None
 
 # Download cover art from MusicBrainz if it doesn't exist locally
@@ -206,18 +1216,18 @@ def download_cover_art(url, output_dir):
         return None
 
     try:
-        response = requests.get(url, stream=True)
+        response = http_request("GET", url, stream=True)
         response.raise_for_status()
         cover_path = os.path.join(output_dir, "cover.jpg")
         with open(cover_path, "wb") as f:
-            for chunk in response.iter_content(1024):
+            for chunk in response.iter_content(1024 * 1024):
                 f.write(chunk)
         return cover_path
     except requests.exceptions.RequestException:
         return None
 
 # Upload album cover art to imgBB API
-def upload_to_imgbb(imgbb_api_key, image_path, imgbb_url, dry_run=False):
+def upload_to_imgbb(imgbb_api_key, image_path, imgbb_url, dry_run=False, image=None):
     if dry_run:
         log_message(f"Simulating upload to imgBB for image: {image_path}", level="INFO", dry_run=True)
         return f"[url=DRY_RUN][img=DRY_RUN][/img][/url]"
@@ -225,12 +1235,16 @@ def upload_to_imgbb(imgbb_api_key, image_path, imgbb_url, dry_run=False):
     if not imgbb_api_key or not os.path.exists(image_path):
         return None
     try:
-        with open(image_path, "rb") as f:
-            response = requests.post(
-                imgbb_url,
-                params={"key": imgbb_api_key},
-                files={"image": f}
-            )
+        # Read the image up front so a retried request sends it again
+        if image is None:
+            with open(image_path, "rb") as f:
+                image = f.read()
+        response = http_request(
+            "POST",
+            imgbb_url,
+            params={"key": imgbb_api_key},
+            files={"image": (os.path.basename(image_path), image)}
+        )
         
         # Parse the JSON response
         data = response.json()
@@ -239,16 +1253,86 @@ def upload_to_imgbb(imgbb_api_key, image_path, imgbb_url, dry_run=False):
             if data.get("status_code") == 400 and data.get("error", {}).get("code") == 100:
                 log_message(data["error"]["message"], level="ERROR")
                 return None
-            log_message("Error:", data.get("error", {}).get("message", "Unknown error"), level="ERROR")
+            log_message(f"Error: {data.get('error', {}).get('message', 'Unknown error')}", level="ERROR")
             return None
 
         img_url = data["data"].get("url")
         thumb_url = data["data"].get("medium", {}).get("url", img_url)
         return f"[url={img_url}][img]{thumb_url}[/img][/url]"
-    except requests.exceptions.RequestException as e:
-        log_message(e, level="ERROR")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log_message(f"imgBB upload: {e}", level="ERROR")
         return None
 
+# Keep imgBB links of uploaded covers for a year
+COVER_CACHE_TTL = 365 * 86400
+
+# Downscale and re-encode a cover as JPEG when it is larger than max_dimension pixels or max_size bytes.
+# Returns the original bytes when it is small enough, Pillow is missing, or re-encoding does not help
+def shrink_cover_art(image, max_dimension=0, max_size=0, quality=90):
+    if not max_dimension and not max_size:
+        return image
+    # Pillow is optional, only needed to downscale oversized cover art before upload
+    try:
+        from PIL import Image
+    except ImportError:
+        log_message("Pillow is not installed, cover art is uploaded at full size.", level="WARNING")
+        return image
+
+    try:
+        picture = Image.open(io.BytesIO(image))
+    except Exception as e:
+        log_message(f"Cover art could not be read for downscaling, uploading as is: {e}", level="WARNING")
+        return image
+
+    with picture:
+        too_large = max_dimension and max(picture.size) > max_dimension
+        if not too_large and (not max_size or len(image) <= max_size):
+            return image
+        picture = picture.convert("RGB")
+        if too_large:
+            picture.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        output = io.BytesIO()
+        picture.save(output, "JPEG", quality=quality, optimize=True)
+
+    shrunk = output.getvalue()
+    return shrunk if len(shrunk) < len(image) else image
+
+# Downscale settings a cached cover upload was made with. Part of every cover cache key, so changing them uploads
+# the covers again
+def cover_settings_key(config):
+    max_size = int(config["cover_max_size_mb"] * 1024 * 1024)
+    return f"{config['cover_max_dimension']}:{max_size}:{config['cover_jpeg_quality']}"
+
+# Upload cover art to imgBB once per distinct image. The BBCode is cached by the image's SHA-256 (and the
+# downscale settings), so the same scan in another edition or on a rerun is not uploaded again. Logs whether the
+# cover was uploaded or reused, None when the upload failed
+def upload_cover_art(image_path, config, cache_path=None, source_url=None):
+    with open(image_path, "rb") as f:
+        image = f.read()
+
+    max_dimension = config["cover_max_dimension"]
+    max_size = int(config["cover_max_size_mb"] * 1024 * 1024)
+    key = f"{hashlib.sha256(image).hexdigest()}:{cover_settings_key(config)}"
+    if cache_path:
+        cached = cache_get(cache_path, "imgbb", key)
+        if cached:
+            log_message("Cover Art: Reusing imgBB upload of identical image", level="INFO")
+            return cached
+
+    upload = shrink_cover_art(image, max_dimension, max_size, config["cover_jpeg_quality"])
+    if len(upload) < len(image):
+        log_message(f"Cover Art: Shrunk from {format_size(len(image))} to {format_size(len(upload))} before upload", level="INFO")
+    uploaded_cover_url = upload_to_imgbb(config["imgbb_api_key"], image_path, config["imgbb_url"], image=upload)
+    if uploaded_cover_url:
+        log_message(f"Cover Art: Uploaded {'downloaded' if source_url else 'existing'} cover art", level="SUCCESS")
+
+    if uploaded_cover_url and cache_path:
+        cache_set(cache_path, "imgbb", key, uploaded_cover_url, COVER_CACHE_TTL)
+        # Remember downloaded covers by URL too, so a rerun can skip the download
+        if source_url:
+            cache_set(cache_path, "cover_source", f"{source_url}:{cover_settings_key(config)}", uploaded_cover_url, COVER_CACHE_TTL)
+    return uploaded_cover_url
+
 # Determine optimal piece size based on the directory size. Taken from RED
 def determine_piece_size(directory_size):
     if directory_size <= 50 * 1024 ** 2:  # Up to 50 MiB
@@ -266,31 +1350,18 @@ def determine_piece_size(directory_size):
     else:  # 2 GiB and up
         return 2048 * 1024  # 2 MiB
 
-# Calculate the total size of files in a directory
-def calculate_directory_size(directory):
-    total_size = 0
-    for dirpath, dirnames, filenames in os.walk(directory):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            total_size += os.path.getsize(fp)
-    return total_size
-
 # Generate a text file with track names, lengths, and album cover URL
-def generate_track_list(config, files, output_file, cover_url=None):
-    track_list = []
+def generate_track_list(config, album_tracks, output_file, cover_url=None):
     disc_tracks = {}
     total_seconds = 0
 
-    for file in files:
-        metadata = File(file)
-        disc_number = metadata.get("discnumber", ["1"])[0]
-        title = metadata.get("title", [os.path.splitext(os.path.basename(file))[0]])[0]
-        duration = int(metadata.info.length)
+    for track in album_tracks:
+        duration = int(track.length)
         total_seconds += duration
         minutes, seconds = divmod(duration, 60)
-        if disc_number not in disc_tracks:
-            disc_tracks[disc_number] = []
-        disc_tracks[disc_number].append(f"{len(disc_tracks[disc_number]) + 1}. {title} [{minutes}:{seconds:02d}]")
+        if track.disc not in disc_tracks:
+            disc_tracks[track.disc] = []
+        disc_tracks[track.disc].append(f"{len(disc_tracks[track.disc]) + 1}. {track.title} [{minutes}:{seconds:02d}]")
 
     total_minutes, total_seconds = divmod(total_seconds, 60)
 
@@ -298,7 +1369,8 @@ def generate_track_list(config, files, output_file, cover_url=None):
     with open(output_file, "w") as f:
         f.write("Tracklist:\n\n")
         if len(disc_tracks) > 1:
-            for disc_number, tracks in sorted(disc_tracks.items()):
+            # Numeric disc order, so disc 10 comes after disc 9
+            for disc_number, tracks in sorted(disc_tracks.items(), key=lambda item: (not item[0].isdigit(), int(item[0]) if item[0].isdigit() else 0, item[0])):
                 f.write(f"Disc {disc_number}:\n")
                 f.write("\n".join(tracks))
                 f.write("\n\n")
@@ -313,36 +1385,217 @@ def generate_track_list(config, files, output_file, cover_url=None):
             f.write(f"\n{cover_url}\n")
 
         # Signature line
-        signature = config.get("signature")
+        signature = config["signature"]
         f.write(f"{signature}")
 
-# Generate a .torrent file with dynamic piece size
-def create_torrent(directory, output_file, tracker_announce, artist, album, year, source, file_type, bitrate):
-    directory_size = calculate_directory_size(directory)
-    piece_size = determine_piece_size(directory_size)
+# Human readable byte count
+def format_size(size):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+# Amount of data each hashing task reads in one go
+HASH_CHUNK_SIZE = 64 * 1024 ** 2
+
+# SHA-1 hash the pieces first..last of the files' concatenated content. Pieces may span file boundaries
+def hash_piece_range(files, offsets, piece_size, first, last):
+    position = first * piece_size
+    end = min(last * piece_size, offsets[-1])
+    index = bisect.bisect_right(offsets, position) - 1
+    digests = []
+    hasher = hashlib.sha1()
+    filled = 0
+
+    while position < end:
+        path, size = files[index]
+        file_position = position - offsets[index]
+        file_end = min(size, end - offsets[index])
+        if file_position < file_end:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if len(mapped) < file_end:
+                    raise OSError(f"File changed while hashing: {path}")
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mapped) as view:
+                    while file_position < file_end:
+                        length = min(piece_size - filled, file_end - file_position)
+                        hasher.update(view[file_position:file_position + length])
+                        file_position += length
+                        position += length
+                        filled += length
+                        if filled == piece_size:
+                            digests.append(hasher.digest())
+                            hasher = hashlib.sha1()
+                            filled = 0
+        index += 1
+
+    if filled:
+        digests.append(hasher.digest())
+    return b"".join(digests)
+
+# Hash a list of (path, size) files into concatenated SHA-1 piece hashes, the same as torf's generate().
+# Pieces already in `known` (piece index -> digest) are not read again
+def hash_pieces(files, piece_size, workers=None, progress=None, known=None):
+    known = known or {}
+    # Global start offset of every file, plus the total size at the end
+    offsets = [0, *itertools.accumulate(size for _, size in files)]
+    total_size = offsets[-1]
+    piece_count = -(-total_size // piece_size)
+    pieces_per_task = max(1, HASH_CHUNK_SIZE // piece_size)
+
+    # Group the missing pieces into runs of at most pieces_per_task
+    tasks = []
+    for index in range(piece_count):
+        if index in known:
+            continue
+        if tasks and tasks[-1][1] == index and index - tasks[-1][0] < pieces_per_task:
+            tasks[-1][1] = index + 1
+        else:
+            tasks.append([index, index + 1])
+
+    digests = [known.get(index) for index in range(piece_count)]
+    to_hash = sum(min(last * piece_size, total_size) - first * piece_size for first, last in tasks)
+    hashed = 0
+    started = time.monotonic()
+    # hashlib releases the GIL on large buffers, so threads hash on all cores
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(hash_piece_range, files, offsets, piece_size, first, last): (first, last) for first, last in tasks}
+        for future in as_completed(futures):
+            first, last = futures[future]
+            result = future.result()
+            digests[first:last] = [result[position:position + 20] for position in range(0, len(result), 20)]
+            hashed += min(last * piece_size, total_size) - first * piece_size
+            if progress:
+                progress(hashed, to_hash, time.monotonic() - started)
+
+    return b"".join(digests)
+
+# Print hashing progress and speed on a single terminal line
+def print_hash_progress(hashed, total_size, elapsed):
+    rate = hashed / elapsed if elapsed else 0
+    end = "\n" if hashed == total_size else ""
+    print(f"\r[i] - Hashing: {hashed * 100 // total_size}% of {format_size(total_size)} at {format_size(rate)}/s", end=end, file=sys.stderr, flush=True)
+
+# (relative path, size, mtime) list of the torrent's files, the key for cached piece hashes. The mtimes come
+# from the album scan
+def file_signatures(files, album_index):
+    return [[os.path.relpath(path, album_index.directory), size, album_index.file_mtimes[path]] for path, size in files]
+
+# Files of an album's torrent from the album scan, picked and ordered the way torf does it when walking the
+# directory itself: hidden files left out, sorted by path
+def torrent_file_list(album_index):
+    files = []
+    for path, size in album_index.file_sizes.items():
+        parts = pathlib.PurePath(os.path.relpath(path, album_index.directory)).parts
+        if not any(part.startswith(".") for part in parts):
+            files.append((parts, path, size))
+    return [(path, size) for _, path, size in sorted(files)]
+
+# Work out which cached piece hashes are still valid for the current files.
+# A piece is reused when it sits at the same offset as before and every file it touches is unchanged
+def reusable_pieces(cached_files, cached_pieces, signatures, piece_size):
+    cached_total = sum(size for _, size, _ in cached_files)
+    total_size = sum(size for _, size, _ in signatures)
+
+    # Files up to valid_end have the same path, size and offset as in the cache
+    valid_end = 0
+    changed = []
+    for index, (path, size, mtime) in enumerate(signatures):
+        if index >= len(cached_files) or cached_files[index][:2] != [path, size]:
+            break
+        if cached_files[index][2] != mtime:
+            changed.append((valid_end, valid_end + size))
+        valid_end += size
+
+    known = {}
+    for index in range(len(cached_pieces) // 20):
+        start = index * piece_size
+        end = min(start + piece_size, total_size)
+        if end > valid_end or end != min(start + piece_size, cached_total):
+            break
+        if not any(start < changed_end and changed_start < end for changed_start, changed_end in changed):
+            known[index] = cached_pieces[index * 20:index * 20 + 20]
+    return known
+
+# Load cached piece hashes for an album, evicting entries older than max_age days
+def load_piece_hashes(cache_path, directory, piece_size, max_age=30):
+    with contextlib.closing(open_cache_db(cache_path)) as db, db:
+        db.execute("CREATE TABLE IF NOT EXISTS piece_hashes (root TEXT, piece_size INTEGER, files TEXT, pieces BLOB, updated REAL, PRIMARY KEY (root, piece_size))")
+        db.execute("DELETE FROM piece_hashes WHERE updated < ?", (time.time() - max_age * 86400,))
+        row = db.execute("SELECT files, pieces FROM piece_hashes WHERE root = ? AND piece_size = ?", (directory, piece_size)).fetchone()
+    if row is None:
+        return [], b""
+    return json.loads(row[0]), row[1]
+
+def store_piece_hashes(cache_path, directory, piece_size, signatures, pieces):
+    with contextlib.closing(open_cache_db(cache_path)) as db, db:
+        db.execute(
+            "INSERT OR REPLACE INTO piece_hashes (root, piece_size, files, pieces, updated) VALUES (?, ?, ?, ?, ?)",
+            (directory, piece_size, json.dumps(signatures), pieces, time.time())
+        )
+
+# Generate a .torrent file with dynamic piece size. The file list comes from the album scan (`album_index`, the
+# directory is scanned when it is not given), torf only writes the metainfo
+def create_torrent(directory, output_file, tracker_announce, artist, album, year, source, file_type, bitrate, hash_workers=None, progress=False, torrent_source=None, hash_cache=None, hash_cache_max_age=30, album_index=None):
+    if album_index is None:
+        album_index = scan_album(directory)
+    piece_size = determine_piece_size(album_index.total_size)
+
+    files = torrent_file_list(album_index)
+    if not files:
+        raise ValueError(f"No files to hash in {directory}")
 
-    torrent = Torrent(
-        path=directory,
+    torrent = torf.Torrent(
         trackers=[tracker_announce],
-        piece_size=piece_size,
         private=True,
+        source=torrent_source,
     )
-
-    # Ensure the name is set correctly inside the torrent
-    torrent.name = os.path.basename(os.path.abspath(directory))
-    torrent.generate()
-    torrent.write(output_file)
+    torrent.metainfo["info"].update({
+        "name": os.path.basename(os.path.abspath(directory)),
+        "piece length": piece_size,
+        "files": [{"length": size, "path": list(pathlib.PurePath(os.path.relpath(path, directory)).parts)} for path, size in files],
+    })
+
+    # Reuse piece hashes of unchanged files from an earlier run
+    known = {}
+    if hash_cache:
+        root = os.path.abspath(directory)
+        signatures = file_signatures(files, album_index)
+        cached_files, cached_pieces = load_piece_hashes(hash_cache, root, piece_size, hash_cache_max_age)
+        known = reusable_pieces(cached_files, cached_pieces, signatures, piece_size)
+
+    started = time.monotonic()
+    pieces = hash_pieces(files, piece_size, hash_workers, print_hash_progress if progress else None, known)
+    elapsed = time.monotonic() - started
+    torrent.metainfo["info"]["pieces"] = pieces
+    if hash_cache:
+        store_piece_hashes(hash_cache, root, piece_size, signatures, pieces)
+    torrent.write(output_file, overwrite=True)
+    hashed_size = torrent.size - sum(min(piece_size, torrent.size - index * piece_size) for index in known)
+    return torrent.size, hashed_size, elapsed
+
+# Copy an already hashed .torrent for another tracker, swapping only the announce URL and source field
+def retarget_torrent(torrent_path, output_file, tracker_announce, torrent_source=None):
+    torrent = torf.Torrent.read(torrent_path)
+    torrent.trackers = [tracker_announce]
+    torrent.source = torrent_source
+    torrent.write(output_file, overwrite=True)
+
+# Release name of an album, parts that are not known (no bitrate label) are left out
+def release_name(artist, album, year, source, file_type, bitrate):
+    return " ".join(str(part) for part in (f"{artist} - {album}", year, source, file_type, bitrate) if part)
 
 # Upload torrent to the selected tracker
-def upload_torrent(
-    torrent_path, tracklist_path, artist, album, year, file_type, tracker_api_url,
-    tracker_api_token, anonymous, personal_release, doubleup, internal, refundable, featured, sticky, source, bitrate, tracker_name, config, args, directory, media_info, dry_run=False
-):
+def upload_torrent(job, tracker_name, torrent_path, tracklist_path, artist, album, year, file_type, bitrate, config, media_info, dry_run=False):
     if dry_run:
         log_message("Simulating torrent upload to tracker.", level="INFO", dry_run=True)
-        return
+        return "Dry Run", None
     
     tracker_config = get_tracker_config(config, tracker_name)
+    tracker_api_url = tracker_config.get("tracker_api_url")
+    tracker_api_token = tracker_config.get("tracker_api_token")
     category_id = tracker_config.get("category_id")
     type_ids = tracker_config.get("type_ids", {})
 
@@ -356,19 +1609,19 @@ def upload_torrent(
             with open(tracklist_path, "r") as tracklist_file:
                 description = tracklist_file.read()
 
-            files = {"torrent": torrent_file}
+            files = {"torrent": (os.path.basename(torrent_path), torrent_file.read())}
             data = {
-                "name": f"{artist} - {album} {year} {source} {file_type} {bitrate}",
+                "name": release_name(artist, album, year, job.source, file_type, bitrate),
                 "description": description,
                 "category_id": category_id,
                 "type_id": type_id,
-                "anonymous": anonymous,
-                "personal_release": personal_release,
-                "doubleup": doubleup,
-                "internal": internal,
-                "refundable": refundable,
-                "featured": featured,
-                "sticky": sticky,
+                "anonymous": job.anonymous,
+                "personal_release": job.personal_release,
+                "doubleup": job.doubleup,
+                "internal": job.internal,
+                "refundable": job.refundable,
+                "featured": job.featured,
+                "sticky": job.sticky,
                 "api_token": tracker_api_token,
                 "mediainfo": media_info,
                 "tmdb": 0,
@@ -383,7 +1636,22 @@ def upload_torrent(
                 "Authorization": f"Bearer {tracker_api_token}",
                 "Accept": "application/json"
             }
-            response = requests.post(tracker_api_url, data=data, files=files, headers=headers)
+            # Not retried once it may have reached the tracker, an accepted upload would come back as a duplicate
+            # without its URL. 429 is left to the tracker's upload queue, which holds back every upload to the
+            # tracker until Retry-After
+            queue = upload_queue(config, tracker_name)
+            for attempt in range(1 + tracker_config["upload_throttle_retries"]):
+                with queue.slot():
+                    response = http_request("POST", tracker_api_url, data=data, files=files, headers=headers)
+                if response.status_code != 429 or attempt == tracker_config["upload_throttle_retries"]:
+                    break
+                delay = retry_after_seconds(response)
+                if delay is None:
+                    delay = http_settings["backoff_factor"] * 2 ** attempt
+                delay = min(delay, http_settings["max_retry_after"])
+                queue.pause(delay)
+                count_metric("upload_throttled")
+                log_message(f"{tracker_name} is throttling uploads, retrying in {delay:.0f}s", level="INFO")
 
             if response.status_code == 200:
                 # Parse the JSON response and extract the URL
@@ -391,58 +1659,158 @@ def upload_torrent(
                 torrent_url = response_data.get("data")
 
                 if torrent_url:
-                    log_message(f"Uploaded Torrent: {torrent_url}", level="SUCCESS")
-                    # Inject the torrent URL into qBittorrent
-                    if args.inject:
-                        qb_inject(config, torrent_url, directory)
+                    log_message(f"Uploaded Torrent ({tracker_name}): {torrent_url}", level="SUCCESS")
+                    return "Uploaded", torrent_url
                 else:
-                    log_message("No torrent URL returned.", level="ERROR")
+                    log_message(f"No torrent URL returned by {tracker_name}.", level="ERROR")
             elif response.status_code == 404 and 'info_hash' in response.json().get('data', {}):
                 # Handle case where torrent already exists
-                log_message("This torrent already exists on the tracker.", level="WARNING")
+                log_message(f"This torrent already exists on {tracker_name}.", level="WARNING")
+                return "Duplicate", None
             else:
-                log_message(f"Torrent Upload: {response.status_code} - {response.json()}", level="ERROR")
+                log_message(f"Torrent Upload ({tracker_name}): {response.status_code} - {response.json()}", level="ERROR")
     except Exception as e:
-        log_message(f"{e}", level="ERROR")
-
-def process_album(directory, tracker_name, config, output_base, tracker_announce, tracker_api_url, tracker_api_token, anonymous, personal_release, doubleup, internal, refundable, featured, sticky, source, bitrate, args):
-    try:
-        # Fetch album info and set up output directory
-        artist, album, year, cover_url, file_type, files = fetch_album_info(directory, config)
-        print(f"\n\n+ {artist} - {album} {year} +\n{'━' * 50}")
-
-        # Extract media info for the first track
-        first_track_path = files[0]
-        media_info = get_media_info(first_track_path)
-
-    except Exception as e:
-        log_message(f"\n{'-' * 30}\nAlbum: {directory} - {str(e)}\n{'#' * 30}")
+        log_message(f"{tracker_name}: {e}", level="ERROR")
+    return "Failed", None
+
+# Ledger of finished work per album and tracker, so reruns skip what is done. A row belongs to the album's
+# files as they were (fingerprint), changed files start over
+LEDGER_DONE = ("Uploaded", "Duplicate")
+
+# Fingerprint of an album's files: relative paths, sizes and mtimes
+def album_fingerprint(album_index):
+    signatures = file_signatures(sorted(album_index.file_sizes.items()), album_index)
+    return hashlib.sha1(json.dumps(signatures).encode()).hexdigest()
+
+def open_ledger_db(ledger_path):
+    db = open_cache_db(ledger_path)
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS uploads (directory TEXT, tracker TEXT, fingerprint TEXT, torrent_path TEXT, info_hash TEXT, "
+        "torrent_url TEXT, status TEXT, injected INTEGER DEFAULT 0, updated REAL, PRIMARY KEY (directory, tracker))"
+    )
+    return db
+
+# Ledger rows of an album by tracker, only those recorded for the same files
+def load_ledger(ledger_path, directory, fingerprint):
+    with contextlib.closing(open_ledger_db(ledger_path)) as db, db:
+        db.row_factory = sqlite3.Row
+        rows = db.execute("SELECT * FROM uploads WHERE directory = ? AND fingerprint = ?", (directory, fingerprint)).fetchall()
+    return {row["tracker"]: dict(row) for row in rows}
+
+# Record finished work of an album for a tracker
+def record_ledger(ledger, tracker_name, **fields):
+    if ledger is None:
         return
+    entry = ledger["entries"].setdefault(tracker_name, {})
+    entry.update(fields)
+    columns = ", ".join(fields)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in fields)
+    with contextlib.closing(open_ledger_db(ledger["path"])) as db, db:
+        db.execute(
+            f"INSERT INTO uploads (directory, tracker, fingerprint, updated, {columns}) VALUES (?, ?, ?, ?, {', '.join('?' * len(fields))}) "
+            f"ON CONFLICT (directory, tracker) DO UPDATE SET fingerprint = excluded.fingerprint, updated = excluded.updated, {updates}",
+            (ledger["directory"], tracker_name, ledger["fingerprint"], time.time(), *fields.values())
+        )
+
+def ledger_entry(ledger, tracker_name):
+    return (ledger or {}).get("entries", {}).get(tracker_name, {})
+
+# True when the ledger says the album needs nothing more on this tracker
+def ledger_done(ledger, tracker_name, inject=False):
+    entry = ledger_entry(ledger, tracker_name)
+    if entry.get("status") not in LEDGER_DONE:
+        return False
+    # Duplicates have no torrent URL of ours to inject
+    return not inject or entry["status"] == "Duplicate" or bool(entry.get("injected"))
+
+# Raised by the album_info stage for albums that must not be uploaded (mixed formats, mislabeled bitrate)
+class AlbumRejected(Exception):
+    pass
+
+# Stage: read the tags of all tracks and set up the output directory
+def album_info_stage(album_index, config, output_base, job):
+    artist, album, year, file_type, tracks = read_album_tags(album_index, config)
+    log_output(f"\n\n+ {artist} - {album} {year} +\n{'━' * 50}")
+
+    # Format and bitrate label come from the stream info of every track. Mixed albums and a bitrate label that
+    # does not match the files are rejected here, before anything is hashed or uploaded
+    audio = album_audio_summary(tracks)
+    file_type = audio["file_type"] or file_type
+    bitrate = audio["encoding"] or job.bitrate
+    problems = list(audio["problems"])
+    # A measured average (AAC) never matches the nominal bitrate exactly, a given label is used as is
+    if job.bitrate and audio["measured"]:
+        bitrate = job.bitrate
+    elif job.bitrate and audio["encoding"] and "".join(job.bitrate.split()).casefold() != "".join(audio["encoding"].split()).casefold():
+        problems.append(f"bitrate '{job.bitrate}' does not match the files ({audio['encoding']})")
+        bitrate = job.bitrate
+    if problems and config["reject_inconsistent_albums"]:
+        raise AlbumRejected("; ".join(problems))
+    for problem in problems:
+        log_message(f"Audio: {problem}", level="WARNING")
+    if not bitrate:
+        log_message("Audio: the bitrate label can not be told from the files, give it with -br", level="WARNING")
+    log_message(f"Audio: {file_type} {audio['encoding'] or 'unknown'}, {audio['bits_per_sample'] or '-'}bit {audio['sample_rate'] or '-'}Hz {audio['channels'] or '-'}ch", level="INFO")
 
     output_dir = os.path.join(output_base, artist, f"{album} ({year})")
-    if not args.dry_run:
+    if not job.dry_run:
         os.makedirs(output_dir, exist_ok=True)
     else:
         log_message(f"Output Directory: {output_dir}", level="DRY RUN")
 
+    return {"artist": artist, "album": album, "year": year, "file_type": file_type, "bitrate": bitrate, "tracks": tracks, "output_dir": output_dir}
+
+# Stage: mediainfo of the first track. It needs nothing from the other stages, so it starts right away
+def media_info_stage(album_index, lookup_cache):
+    return get_media_info(album_index.audio_files[0], lookup_cache)
+
+# Stage: mediainfo's JSON output of the first track, when mediainfo_json is on
+def media_info_json_stage(album_index, config, lookup_cache):
+    if not config["mediainfo_json"]:
+        return None
+    media_info_json = get_media_info_json(album_index.audio_files[0], lookup_cache)
+    if media_info_json:
+        fields = media_info_audio_fields(media_info_json)
+        log_message(f"Media Info: {fields['format']} {fields['bit_depth'] or '-'}bit {fields['sample_rate'] or '-'}Hz {fields['channels'] or '-'}ch", level="INFO")
+    return media_info_json
+
+# Stage: keep mediainfo's JSON next to the tracklist so other tools can reuse it
+def media_info_file_stage(job, album_info, media_info_json):
+    if not media_info_json or job.dry_run:
+        return None
+    media_info_file = os.path.join(album_info["output_dir"], "mediainfo.json")
+    with open(media_info_file, "w") as f:
+        json.dump(media_info_json, f, indent=2)
+    return media_info_file
+
+# Stage: upload local cover art, or look it up on MusicBrainz, download and upload it. Returns the imgBB BBCode
+def cover_stage(album_index, config, lookup_cache, job, album_info):
+    artist, album, year, output_dir = album_info["artist"], album_info["album"], album_info["year"], album_info["output_dir"]
+    uploaded_cover_url = None
+
     # Check if cover art exists in the directory
-    valid_cover_art = config.get("valid_cover_art")
-    cover_path = local_cover_art(directory, valid_cover_art, artist, album)
+    valid_cover_art = config["valid_cover_art"]
+    cover_path = local_cover_art(album_index, valid_cover_art, artist, album)
 
     if cover_path:
-        if args.dry_run:
+        if job.dry_run:
             log_message(f"Cover Art: {cover_path}", level="DRY RUN")
         else:
             try:
-                uploaded_cover_url = upload_to_imgbb(config.get("imgbb_api_key"), cover_path, config.get("imgbb_url"))
-                log_message("Cover Art: Uploaded existing cover art", level="SUCCESS")
+                uploaded_cover_url = upload_cover_art(cover_path, config, lookup_cache)
             except Exception as e:
                 log_message(f"Error uploading local cover art: {str(e)}", level="ERROR")
     else:
-        log_message("No local cover art found.", level="DRY RUN", dry_run=args.dry_run)
+        log_message("No local cover art found.", level="DRY RUN", dry_run=job.dry_run)
+        # Search for the release in MusicBrainz only when there is no local cover art
+        cover_url = lookup_cover_url(artist, album, config, lookup_cache)
+        cached_cover_url = cache_get(lookup_cache, "cover_source", f"{cover_url}:{cover_settings_key(config)}") if cover_url and lookup_cache else None
         if cover_url:
-            if args.dry_run:
+            if job.dry_run:
                 log_message(f"Would download: {cover_url}", level="DRY RUN")
+            elif cached_cover_url:
+                uploaded_cover_url = cached_cover_url
+                log_message("Cover Art: Reusing imgBB upload of downloaded cover art", level="INFO")
             else:
                 try:
                     cover_path = download_cover_art(cover_url, output_dir)
@@ -450,71 +1818,1189 @@ def process_album(directory, tracker_name, config, output_base, tracker_announce
                         cover_file_name = f"{artist} - {album} {year}.jpg"
                         cover_file_path = os.path.join(output_dir, cover_file_name)
                         os.rename(cover_path, cover_file_path)
-                        uploaded_cover_url = upload_to_imgbb(config.get("imgbb_api_key"), cover_file_path, config.get("imgbb_url"))
+                        uploaded_cover_url = upload_cover_art(cover_file_path, config, lookup_cache, cover_url)
                     else:
                         log_message("Cover Art: Not Found", level="ERROR")
                 except Exception as e:
                     log_message(f"Error downloading cover art: {str(e)}", level="ERROR")
 
-    # Generate tracklist
-    if args.dry_run:
-        log_message(f"Tracklist: {output_dir}", level="DRY RUN")
-    else:
+    return uploaded_cover_url
+
+# Stage: write the tracklist with the uploaded cover art
+def tracklist_stage(config, job, album_info, cover):
+    if job.dry_run:
+        log_message(f"Tracklist: {album_info['output_dir']}", level="DRY RUN")
+        return None
+    try:
+        tracklist_file = os.path.join(album_info["output_dir"], config["tracklist_filename"])
+        generate_track_list(config, album_info["tracks"], tracklist_file, cover_url=cover)
+        log_message(f"Tracklist File: {os.path.basename(tracklist_file)}")
+        return tracklist_file
+    except Exception as e:
+        log_message(f"Error generating track list for album {album_info['album']}: {str(e)}", level="ERROR")
+        return None
+
+# Stage: hash the album and write one .torrent per tracker the album is not uploaded to yet. Torrents of an earlier
+# run for the same files are reused. Returns {tracker name: torrent path}, None on failure
+def torrent_stage(job, album_index, config, output_base, ledger, album_info):
+    directory, tracker_names, source = job.directory, job.tracker_names, job.source
+    artist, album, year, file_type, bitrate, output_dir = album_info["artist"], album_info["album"], album_info["year"], album_info["file_type"], album_info["bitrate"], album_info["output_dir"]
+
+    # One .torrent per tracker, tracker name is added to the file name when cross-posting
+    torrent_files = {}
+    for tracker_name in tracker_names:
+        suffix = f" [{tracker_name}]" if len(tracker_names) > 1 else ""
+        torrent_files[tracker_name] = f"{release_name(artist, album, year, source, file_type, bitrate)}{suffix}.torrent"
+    # Any torrent of an earlier run for the same files, also of trackers that are done, saves hashing
+    earlier_torrents = [ledger_entry(ledger, tracker_name).get("torrent_path") for tracker_name in tracker_names]
+    earlier_torrent = next((path for path in earlier_torrents if path and os.path.exists(path)), None)
+    tracker_names = [tracker_name for tracker_name in tracker_names if ledger_entry(ledger, tracker_name).get("status") not in LEDGER_DONE]
+    torrent_files = {tracker_name: torrent_files[tracker_name] for tracker_name in tracker_names}
+    if not tracker_names:
+        return torrent_files
+
+    # Generate .torrent file with dynamic file type in name. Data is hashed once for the first tracker,
+    # the other trackers get a copy with their own announce URL and source field
+    if job.dry_run:
+        for torrent_file in torrent_files.values():
+            log_message(f"Torrent File: '{torrent_file}'", level="DRY RUN")
+        return torrent_files
+
+    try:
+        torrent_files = {tracker_name: os.path.join(output_dir, torrent_file) for tracker_name, torrent_file in torrent_files.items()}
+        reused = [
+            tracker_name for tracker_name in tracker_names
+            if ledger_entry(ledger, tracker_name).get("torrent_path") == torrent_files[tracker_name] and os.path.exists(torrent_files[tracker_name])
+        ]
+        for tracker_name in reused:
+            log_message(f"Torrent File: {os.path.basename(torrent_files[tracker_name])} (from an earlier run)")
+        pending = [tracker_name for tracker_name in tracker_names if tracker_name not in reused]
+        if not pending:
+            return torrent_files
+        if earlier_torrent:
+            # Copies of a torrent from an earlier run need no hashing at all
+            first_torrent, other_trackers = earlier_torrent, pending
+        else:
+            first_tracker, *other_trackers = pending
+            first_torrent = torrent_files[first_tracker]
+            tracker_config = get_tracker_config(config, first_tracker)
+            show_progress = hash_pool is None and album_log.get() is None and sys.stderr.isatty()
+            hash_cache = None if job.no_hash_cache else os.path.join(get_cache_dir(config, output_base), "hashes.sqlite")
+            torrent_size, hashed_size, hash_seconds = run_cpu_bound(
+                create_torrent, directory, torrent_files[first_tracker], tracker_config.get("tracker_announce"), artist, album, year, source, file_type, bitrate,
+                config["hash_workers"], show_progress, tracker_config.get("torrent_source"), hash_cache, config["hash_cache_max_age"],
+                album_index
+            )
+            count_metric("bytes_hashed", hashed_size)
+            count_metric("bytes_from_hash_cache", torrent_size - hashed_size)
+            rate = hashed_size / hash_seconds if hash_seconds else 0
+            if hashed_size == torrent_size:
+                hash_summary = f"{format_size(hashed_size)} at {format_size(rate)}/s"
+            elif hashed_size:
+                hash_summary = f"hashed {format_size(hashed_size)} of {format_size(torrent_size)} at {format_size(rate)}/s, rest from hash cache"
+            else:
+                hash_summary = f"{format_size(torrent_size)} from hash cache"
+            log_message(f"Torrent File: {os.path.basename(torrent_files[first_tracker])} ({hash_summary})")
+        for tracker_name in other_trackers:
+            tracker_config = get_tracker_config(config, tracker_name)
+            retarget_torrent(first_torrent, torrent_files[tracker_name], tracker_config.get("tracker_announce"), tracker_config.get("torrent_source"))
+            log_message(f"Torrent File: {os.path.basename(torrent_files[tracker_name])}")
+        for tracker_name in pending:
+            record_ledger(ledger, tracker_name, torrent_path=torrent_files[tracker_name], info_hash=torf.Torrent.read(torrent_files[tracker_name]).infohash)
+        return torrent_files
+    except Exception as e:
+        log_message(f"Error creating torrent file for album {album}: {str(e)}", level="ERROR")
+        return None
+
+# Stage: upload the torrent files to all trackers at the same time, then inject them into qBittorrent. Trackers the
+# ledger has as done are not uploaded to again. Returns the album status
+def upload_stage(job, config, ledger, album_info, media_info, tracklist, torrent):
+    directory, tracker_names = job.directory, job.tracker_names
+    if torrent is None:
+        return "Failed"
+
+    if job.dry_run:
+        for torrent_file in torrent.values():
+            log_message(f"Upload Torrent: '{torrent_file}'", level="DRY RUN")
+        return "Dry Run"
+
+    artist, album, year, file_type = album_info["artist"], album_info["album"], album_info["year"], album_info["file_type"]
+    statuses = {}
+    torrent_urls = {}
+    for tracker_name in tracker_names:
+        entry = ledger_entry(ledger, tracker_name)
+        if entry.get("status") in LEDGER_DONE:
+            statuses[tracker_name] = entry["status"]
+            torrent_urls[tracker_name] = entry.get("torrent_url")
+            log_message(f"Already uploaded to {tracker_name}: {entry.get('torrent_url') or entry.get('info_hash')}", level="INFO")
+
+    pending = [tracker_name for tracker_name in tracker_names if tracker_name not in statuses]
+    if pending:
+        with ThreadPoolExecutor(max_workers=len(pending)) as upload_pool:
+            futures = {
+                tracker_name: submit_in_context(
+                    upload_pool, upload_torrent, job, tracker_name, torrent[tracker_name], tracklist, artist, album, year, file_type, album_info["bitrate"], config, media_info
+                )
+                for tracker_name in pending
+            }
+            for tracker_name, future in futures.items():
+                try:
+                    statuses[tracker_name], torrent_urls[tracker_name] = future.result()
+                except Exception as e:
+                    log_message(f"Error uploading torrent for album {album} to {tracker_name}: {str(e)}", level="ERROR")
+                    statuses[tracker_name] = "Failed"
+                record_ledger(ledger, tracker_name, status=statuses[tracker_name], torrent_url=torrent_urls.get(tracker_name))
+
+    # Inject the torrents into qBittorrent, by URL or as .torrent files with the hash check skipped
+    if job.inject:
+        for tracker_name in tracker_names:
+            entry = ledger_entry(ledger, tracker_name)
+            if torrent_urls.get(tracker_name) and not entry.get("injected"):
+                # Trackers uploaded by an earlier run are not in `torrent`, their .torrent is in the ledger
+                torrent_file = torrent.get(tracker_name) or entry.get("torrent_path")
+                if config['qBittorrent']['inject_mode'] == "file" and torrent_file and os.path.exists(torrent_file):
+                    inject_torrent_file(config, tracker_name, torrent_file, torrent_urls[tracker_name], directory, ledger)
+                elif qb_inject(config, torrent_urls[tracker_name], directory):
+                    record_ledger(ledger, tracker_name, injected=1)
+
+    if len(statuses) == 1:
+        return statuses[tracker_names[0]]
+    return ", ".join(f"{tracker_name} {statuses[tracker_name]}" for tracker_name in tracker_names)
+
+# Run a small graph of tasks. `tasks` maps a name to (function, names of the tasks it needs) and every function is
+# called with the results of those tasks as keyword arguments. A task starts as soon as everything it needs is done,
+# its wall time goes to the album's metrics
+def run_task_graph(tasks, executor):
+    results = {}
+    running = {}
+    pending = dict(tasks)
+
+    while pending or running:
+        for name, (fn, needs) in list(pending.items()):
+            if all(need in results for need in needs):
+                running[submit_in_context(executor, run_stage, name, fn, **{need: results[need] for need in needs})] = name
+                del pending[name]
+        if not running:
+            raise ValueError(f"Tasks with missing dependencies: {', '.join(pending)}")
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            results[running.pop(future)] = future.result()
+
+    return results
+
+def process_album(job, config, output_base):
+    directory, tracker_names = job.directory, job.tracker_names
+    lookup_cache = None if job.dry_run else os.path.join(get_cache_dir(config, output_base), "lookups.sqlite")
+    metrics = new_metrics()
+    metrics_token = album_metrics.set(metrics)
+    started = time.monotonic()
+    status = "Error"
+
+    try:
+        # Scan the album directory once, every stage works from this index
+        album_index = run_stage("scan", scan_album, directory=directory, file_types=config["file_types"])
+        if not album_index.audio_files:
+            raise FileNotFoundError("No supported audio files found in the specified directory.")
+
+        # Work finished by earlier runs for the same files. Albums that need nothing more are skipped before
+        # anything is read, hashed or uploaded
+        ledger = None
+        if not job.dry_run:
+            ledger_path = os.path.join(get_cache_dir(config, output_base), "ledger.sqlite")
+            ledger = {"path": ledger_path, "directory": os.path.abspath(directory), "fingerprint": album_fingerprint(album_index), "entries": {}}
+            if not job.force:
+                ledger["entries"] = load_ledger(ledger_path, ledger["directory"], ledger["fingerprint"])
+            if all(ledger_done(ledger, tracker_name, job.inject) for tracker_name in tracker_names):
+                log_message(f"Already uploaded to {', '.join(tracker_names)}, skipping: {directory} (--force to upload again)", level="INFO")
+                status = "Skipped"
+                return status
+
+        # Stages of an album and the stages they need. Hashing runs while mediainfo, MusicBrainz and imgBB are
+        # busy, only the tracker upload waits for everything
+        stages = {
+            "album_info": (functools.partial(album_info_stage, album_index, config, output_base, job), ()),
+            "media_info": (functools.partial(media_info_stage, album_index, lookup_cache), ()),
+            "media_info_json": (functools.partial(media_info_json_stage, album_index, config, lookup_cache), ()),
+            "media_info_file": (functools.partial(media_info_file_stage, job), ("album_info", "media_info_json")),
+            "cover": (functools.partial(cover_stage, album_index, config, lookup_cache, job), ("album_info",)),
+            "tracklist": (functools.partial(tracklist_stage, config, job), ("album_info", "cover")),
+            "torrent": (functools.partial(torrent_stage, job, album_index, config, output_base, ledger), ("album_info",)),
+            "upload": (
+                functools.partial(upload_stage, job, config, ledger),
+                ("album_info", "media_info", "tracklist", "torrent")
+            ),
+        }
+        with ThreadPoolExecutor(max_workers=len(stages)) as stage_pool:
+            results = run_task_graph(stages, stage_pool)
+        status = results["upload"]
+    except AlbumRejected as e:
+        log_message(f"Rejected: {directory} - {e}", level="ERROR")
+        status = "Rejected"
+    except Exception as e:
+        log_message(f"\n{'-' * 30}\nAlbum: {directory} - {str(e)}\n{'#' * 30}")
+    finally:
+        album_metrics.reset(metrics_token)
+        record_album_report({"directory": directory, "status": status, "seconds": round(time.monotonic() - started, 3), **metrics})
+
+    return status
+
+# Process one album of a batch and time it for the summary table
+def batch_album(job, config, output_base):
+    started = time.monotonic()
+    status = process_album(job, config, output_base)
+    return os.path.basename(job.directory), status, time.monotonic() - started
+
+# Grouped album log lines for parallel runs
+def batch_album_grouped(job, config, output_base):
+    with grouped_log():
+        return batch_album(job, config, output_base)
+
+# Rows of the end-of-run table kept at most, later albums only count in the totals
+BATCH_SUMMARY_ROWS = 1000
+
+# Results of a batch for the end-of-run table. Every album counts in the totals, only the first
+# BATCH_SUMMARY_ROWS albums without a hidden status keep a row, so library and watch runs stay small in memory.
+# Rows are listed in the order of their index (submission order), or as added
+class BatchResults:
+    def __init__(self, hidden_statuses=()):
+        self.hidden_statuses = hidden_statuses
+        self.rows = {}
+        self.counts = {}
+        self.total = 0
+        self.unlisted = 0
+
+    def add(self, result, index=None):
+        name, status, seconds = result
+        self.total += 1
+        self.counts[status] = self.counts.get(status, 0) + 1
+        if status in self.hidden_statuses:
+            return
+        if len(self.rows) < BATCH_SUMMARY_ROWS:
+            self.rows[self.total if index is None else index] = result
+        else:
+            self.unlisted += 1
+
+    def __len__(self):
+        return self.total
+
+# Print the end-of-run table with the status and wall time of every album. Albums with a hidden status
+# only show up in the totals
+def print_batch_summary(results, elapsed):
+    rows = [results.rows[index] for index in sorted(results.rows)]
+    width = max([len("Album")] + [len(name) for name, _, _ in rows])
+    status_width = max([10] + [len(status) for _, status, _ in rows])
+    log_output(f"\n\n+ Batch Summary +\n{'━' * 50}")
+    log_output(f"{'Album':<{width}}  {'Status':<{status_width}}  Time")
+    for name, status, seconds in rows:
+        log_output(f"{name:<{width}}  {status:<{status_width}}  {seconds:.1f}s")
+    if results.unlisted:
+        log_output(f"... {results.unlisted} more")
+    totals = ", ".join(f"{count} {status}" for status, count in results.counts.items())
+    log_output(f"{'━' * 50}\n{results.total} albums in {elapsed:.1f}s ({totals})")
+
+# Round the floats of a report to milliseconds
+def round_floats(value):
+    if isinstance(value, float):
+        return round(value, 3)
+    if isinstance(value, dict):
+        return {key: round_floats(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [round_floats(item) for item in value]
+    return value
+
+# Summary of the run from the run totals: album statuses, stage times and the run's counters per upstream host
+def run_summary(elapsed, jobs):
+    return round_floats({
+        "finished": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "seconds": elapsed,
+        "albums": run_totals["albums"],
+        "jobs": jobs,
+        "statuses": dict(run_totals["statuses"]),
+        "stages": run_totals["stages"],
+        "counters": run_metrics["counters"],
+        "hosts": run_metrics["hosts"],
+    })
+
+# Write the run summary and the report of every album as JSON
+def write_run_report(report_path, summary):
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w") as f:
+        json.dump({"run": summary, "albums": round_floats(album_reports or [])}, f, indent=2)
+
+# Write the run summary in Prometheus' text format for node_exporter's textfile collector. The file is
+# replaced in one step so the collector never reads half of it
+def write_prometheus_textfile(textfile_path, summary):
+    def label(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    metrics = [
+        ("inferno_run_seconds", "Wall time of the last run.", [("", summary["seconds"])]),
+        ("inferno_last_run_timestamp_seconds", "Unix time the last run finished.", [("", round(time.time()))]),
+        ("inferno_albums", "Albums of the last run by status.", [(f'status="{label(status)}"', count) for status, count in summary["statuses"].items()]),
+        ("inferno_stage_seconds", "Wall time spent in each album stage, summed over the albums of the last run.", [(f'stage="{label(name)}"', stage["total"]) for name, stage in summary["stages"].items()]),
+        ("inferno_stage_max_seconds", "Longest run of each album stage in the last run.", [(f'stage="{label(name)}"', stage["max"]) for name, stage in summary["stages"].items()]),
+    ]
+    for name, value in summary["counters"].items():
+        metrics.append((f"inferno_{name}", f"{name.replace('_', ' ').capitalize()} in the last run.", [("", value)]))
+    for name in sorted({name for counters in summary["hosts"].values() for name in counters}):
+        samples = [(f'host="{label(host)}"', counters[name]) for host, counters in summary["hosts"].items() if name in counters]
+        metrics.append((f"inferno_http_{name}", f"HTTP {name} per upstream host in the last run.", samples))
+
+    lines = []
+    for name, help_text, samples in metrics:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [f"{name}{{{labels}}} {value}" if labels else f"{name} {value}" for labels, value in samples]
+
+    temp_path = f"{textfile_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(temp_path, textfile_path)
+
+# Process albums from a list or a crawler, up to `jobs` at the same time. Only a few more albums than are running
+# are taken from it, so crawling a huge library stays small in memory. Returns (name, status, seconds) of
+# every album in the order the albums came
+def process_albums(album_jobs, config, output_base, jobs, results):
+    # Torrents injected as files are added to qBittorrent a batch at a time
+    start_inject_queue()
+    try:
+        process_album_jobs(album_jobs, config, output_base, jobs, results)
+    finally:
+        flush_inject_queue(config)
+
+# Run the albums of process_albums, inline or on a thread pool, adding them to `results` (BatchResults)
+def process_album_jobs(album_jobs, config, output_base, jobs, results):
+    if jobs == 1:
+        for album_job in album_jobs:
+            results.add(batch_album(album_job, config, output_base))
+        return
+
+    # Albums run on a thread pool (network bound), torrent hashing goes to a process pool
+    start_hash_pool(min(jobs, os.cpu_count() or 1))
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as album_pool:
+            running = {}
+            for index, album_job in enumerate(album_jobs):
+                if len(running) >= 2 * jobs:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        done_index = running.pop(future)
+                        results.add(future.result(), done_index)
+                running[submit_in_context(album_pool, batch_album_grouped, album_job, config, output_base)] = index
+            for future in as_completed(running):
+                results.add(future.result(), running[future])
+    finally:
+        stop_hash_pool()
+
+# Process every album of an artist directory. `job` is the template, every album gets a copy with its directory
+def batch_process(artist_directory, job, config, output_base, jobs=1):
+    album_paths = [os.path.join(artist_directory, album_dir) for album_dir in os.listdir(artist_directory)]
+    album_paths = [album_path for album_path in album_paths if os.path.isdir(album_path)]
+    started = time.monotonic()
+
+    # Process all albums in the artist directory
+    album_jobs = [dataclasses.replace(job, directory=album_path) for album_path in album_paths]
+    results = BatchResults()
+    process_albums(album_jobs, config, output_base, max(1, jobs), results)
+    print_batch_summary(results, time.monotonic() - started)
+
+# Disc folders (CD1, Disc 2 ...) belong to the album directory above them
+DISC_DIRECTORY = re.compile(r"^(cd|disc|disk)[\s._-]*\d+\b", re.IGNORECASE)
+
+# Album directory of a directory with audio files: the directory itself, or its parent for disc folders.
+# None for the watch root itself
+def album_directory_of(directory, root):
+    while DISC_DIRECTORY.match(os.path.basename(directory)) and os.path.dirname(directory) != root:
+        directory = os.path.dirname(directory)
+    return None if os.path.normpath(directory) == os.path.normpath(root) else directory
+
+# True if path is one of the given directories or inside one of them
+def is_below(path, directories):
+    return any(os.path.commonpath([path, directory]) == directory for directory in directories)
+
+# True if a directory has files of the given types right in it
+def has_audio_files(directory, extensions):
+    try:
+        with os.scandir(directory) as entries:
+            return any(entry.name.lower().endswith(extensions) and not entry.is_dir() for entry in entries)
+    except OSError:
+        return False
+
+# True if the scandir entries of a directory make it an album: audio files right in it, or disc folders that
+# have them
+def is_album(entries, extensions):
+    return any(
+        DISC_DIRECTORY.match(entry.name) and has_audio_files(entry.path, extensions) if entry.is_dir(follow_symlinks=False)
+        else entry.name.lower().endswith(extensions)
+        for entry in entries
+    )
+
+# Walk a library and yield album directories at any depth: directories with audio files, or with disc folders
+# that have them. Albums are not searched further, so disc folders are not yielded on their own.
+# Relative paths must match one of the include globs (if any) and none of the exclude globs, excluded
+# directories are not entered. Directories are visited one level at a time in name or mtime (oldest
+# first) order, only the directories still to visit are kept in memory
+def iter_album_directories(root, file_types, include=(), exclude=(), order="name", skip=()):
+    extensions = tuple(ext.lower() for ext in file_types)
+    root = os.path.abspath(root)
+    pending = [root]
+
+    while pending:
+        directory = pending.pop()
+        relative = os.path.relpath(directory, root)
+        if directory != root and (is_below(directory, skip) or any(fnmatch.fnmatch(relative, pattern) for pattern in exclude)):
+            continue
+
         try:
-            tracklist_file = os.path.join(output_dir, config.get("tracklist_filename"))
-            generate_track_list(config, files, tracklist_file, cover_url=uploaded_cover_url)
-            log_message(f"Tracklist File: {os.path.basename(tracklist_file)}")
-        except Exception as e:
-            log_message(f"Error generating track list for album {album}: {str(e)}", level="ERROR")
+            with os.scandir(directory) as entries:
+                entries = list(entries)
+        except OSError as e:
+            log_message(f"Library: {e}", level="WARNING")
+            continue
+
+        if directory != root and is_album(entries, extensions):
+            if not include or any(fnmatch.fnmatch(relative, pattern) for pattern in include):
+                yield directory
+            continue
+
+        subdirs = [entry for entry in entries if entry.is_dir(follow_symlinks=False)]
+        if order == "mtime":
+            subdirs.sort(key=lambda entry: entry.stat(follow_symlinks=False).st_mtime, reverse=True)
+        else:
+            subdirs.sort(key=lambda entry: entry.name.casefold(), reverse=True)
+        pending.extend(entry.path for entry in subdirs)
+
+# Process every album below a library root, crawling and processing at the same time
+def library_process(library_root, job, config, output_base, jobs=1, include=(), exclude=(), order="name"):
+    # inferno's own output is not part of the library, even when it is inside it
+    skip = [os.path.abspath(output_base), os.path.abspath(get_cache_dir(config, output_base))]
+    album_paths = iter_album_directories(library_root, config["file_types"], include, exclude, order, skip)
+    started = time.monotonic()
+
+    album_jobs = (dataclasses.replace(job, directory=album_path) for album_path in album_paths)
+    # Reruns over a whole library are mostly albums the ledger skips, the table lists the rest
+    results = BatchResults(hidden_statuses=("Skipped",))
+    process_albums(album_jobs, config, output_base, max(1, jobs), results)
+    print_batch_summary(results, time.monotonic() - started)
+
+# Cross-seeding: .torrent files from elsewhere are matched to albums on disk by their file sizes, then a few
+# sampled pieces are hashed to confirm the match. No album is hashed in full
+CROSS_SEED_SAMPLES = 8
+
+# What matching needs from a .torrent: name, info hash, piece size, piece hashes and the (relative path, size)
+# of every file. None for single file torrents, albums are directories
+def read_cross_seed_torrent(torrent_path):
+    torrent = torf.Torrent.read(torrent_path, validate=False)
+    info = torrent.metainfo["info"]
+    if "files" not in info:
+        return None
+    return {
+        "path": torrent_path,
+        "name": info["name"],
+        "infohash": torrent.infohash,
+        "piece_size": info["piece length"],
+        "pieces": info["pieces"],
+        "files": [(os.path.join(*entry["path"]), entry["length"]) for entry in info["files"]],
+    }
 
-    # Generate .torrent file with dynamic file type in name
-    if args.dry_run:
-        log_message(f"Torrent File: '{artist} - {album} {year} {source} {file_type} {bitrate}.torrent'", level="DRY RUN")
+# .torrent files given on the command line, directories are searched recursively
+def iter_torrent_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    if filename.lower().endswith(".torrent"):
+                        yield os.path.join(directory, filename)
+        else:
+            yield path
+
+# Albums on disk by the sorted sizes of their files (the multiset) and by the size of every file
+class SizeIndex:
+    def __init__(self):
+        self.albums = {}
+        self.by_sizes = {}
+        self.by_size = {}
+
+    def add(self, album_index):
+        files = {os.path.relpath(path, album_index.directory): size for path, size in album_index.file_sizes.items()}
+        self.albums[album_index.directory] = files
+        self.by_sizes.setdefault(tuple(sorted(files.values())), []).append(album_index.directory)
+        for size in set(files.values()):
+            self.by_size.setdefault(size, set()).add(album_index.directory)
+
+    # Albums with exactly the torrent's file sizes, else albums that have every size of it among other files
+    # (logs, scans, our tracklist). The rarest size is intersected first
+    def candidates(self, sizes):
+        exact = self.by_sizes.get(tuple(sorted(sizes)))
+        if exact:
+            return exact
+        directory_sets = sorted((self.by_size.get(size, set()) for size in set(sizes)), key=len)
+        if not directory_sets or not directory_sets[0]:
+            return []
+        return sorted(set.intersection(*directory_sets))
+
+# Local (path, size) of every torrent file in torrent order. Files are matched by relative path and size, the
+# rest by size alone (renamed files). Returns the files and whether any was renamed, None when one is missing
+def map_torrent_files(torrent_files, directory, local_files):
+    unused = dict(local_files)
+    mapped = [None] * len(torrent_files)
+    for index, (relative_path, size) in enumerate(torrent_files):
+        if unused.get(relative_path) == size:
+            mapped[index] = relative_path
+            del unused[relative_path]
+
+    by_size = {}
+    for relative_path, size in sorted(unused.items()):
+        by_size.setdefault(size, []).append(relative_path)
+    renamed = False
+    for index, (relative_path, size) in enumerate(torrent_files):
+        if mapped[index] is None:
+            if not by_size.get(size):
+                return None, False
+            mapped[index] = by_size[size].pop(0)
+            renamed = True
+    return [(os.path.join(directory, relative_path), size) for relative_path, (_, size) in zip(mapped, torrent_files)], renamed
+
+# Piece indexes to verify: first, last and evenly spaced in between
+def sample_pieces(piece_count, samples):
+    if samples >= piece_count:
+        return list(range(piece_count))
+    if samples <= 1:
+        return [0]
+    return sorted({round(n * (piece_count - 1) / (samples - 1)) for n in range(samples)})
+
+# Hash the sampled pieces of the mapped files and compare them with the torrent's piece hashes
+def verify_sampled_pieces(files, piece_size, pieces, samples):
+    offsets = [0, *itertools.accumulate(size for _, size in files)]
+    piece_count = len(pieces) // 20
+    if -(-offsets[-1] // piece_size) != piece_count:
+        return False
+    for index in sample_pieces(piece_count, samples):
+        count_metric("bytes_hashed", min(piece_size, offsets[-1] - index * piece_size))
+        if hash_piece_range(files, offsets, piece_size, index, index + 1) != pieces[index * 20:index * 20 + 20]:
+            return False
+    return True
+
+# Find the album of one torrent. Returns (torrent, directory, renamed) with directory None when nothing matched
+def match_torrent(torrent, size_index, samples):
+    for directory in size_index.candidates([size for _, size in torrent["files"]]):
+        files, renamed = map_torrent_files(torrent["files"], directory, size_index.albums[directory])
+        if files is None:
+            continue
+        try:
+            if verify_sampled_pieces(files, torrent["piece_size"], torrent["pieces"], samples):
+                return torrent, directory, renamed
+        except OSError as e:
+            log_message(f"Cross-seed: {e}", level="WARNING")
+    return torrent, None, False
+
+# Match .torrent files against the albums of -d, -b -d or -l and list the matches. With -i matches are added to
+# qBittorrent with the hash check skipped, saved where the files are. Torrents that need renamed files are only listed
+def cross_seed(torrent_paths, directory, config, output_base, args):
+    started = time.monotonic()
+    if args.library:
+        skip = [os.path.abspath(output_base), os.path.abspath(get_cache_dir(config, output_base))]
+        album_paths = iter_album_directories(args.library, config["file_types"], args.include or (), args.exclude or (), args.order, skip)
+    elif args.batch:
+        album_paths = [os.path.join(directory, album_dir) for album_dir in sorted(os.listdir(directory))]
+        album_paths = [album_path for album_path in album_paths if os.path.isdir(album_path)]
     else:
+        album_paths = [directory]
+
+    size_index = SizeIndex()
+    for album_path in album_paths:
         try:
-            torrent_file = os.path.join(output_dir, f"{artist} - {album} {year} {source} {file_type} {bitrate}.torrent")
-            create_torrent(directory, torrent_file, tracker_announce, artist, album, year, source, file_type, bitrate)
-            log_message(f"Torrent File: {os.path.basename(torrent_file)}")
-        except Exception as e:
-            log_message(f"Error creating torrent file for album {album}: {str(e)}", level="ERROR")
+            size_index.add(scan_album(os.path.abspath(album_path)))
+        except OSError as e:
+            log_message(f"Cross-seed: {e}", level="WARNING")
 
-    # Upload the torrent file to the tracker
-    if args.dry_run:
-        log_message(f"Upload Torrent: '{artist} - {album} {year} {source} {file_type} {bitrate}.torrent'", level="DRY RUN")
-    else:
+    torrents = []
+    skipped = 0
+    for torrent_path in iter_torrent_files(torrent_paths):
         try:
-            upload_torrent(torrent_file, tracklist_file, artist, album, year, file_type, tracker_api_url, tracker_api_token, anonymous, personal_release, doubleup, internal, refundable, featured, sticky, source, bitrate, tracker_name, config, args, directory, media_info)
+            torrent = read_cross_seed_torrent(torrent_path)
         except Exception as e:
-            log_message(f"Error uploading torrent for album {album}: {str(e)}", level="ERROR")
+            log_message(f"Cross-seed: could not read {torrent_path}: {e}", level="WARNING")
+            torrent = None
+        if torrent is None:
+            skipped += 1
+        else:
+            torrents.append(torrent)
+    indexed = time.monotonic() - started
+    log_message(f"Cross-seed: {len(size_index.albums)} albums and {len(torrents)} torrents indexed in {indexed:.1f}s", level="INFO")
+
+    samples = args.samples if args.samples is not None else CROSS_SEED_SAMPLES
+    matches = []
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        for torrent, album_path, renamed in pool.map(lambda torrent: match_torrent(torrent, size_index, samples), torrents):
+            if album_path is None:
+                continue
+            matches.append((torrent, album_path, renamed))
+            note = " (renamed files, not injected)" if renamed and args.inject else ""
+            log_message(f"Match: {os.path.basename(torrent['path'])} -> {album_path}{note}", level="SUCCESS")
+
+    if args.inject and not args.dry_run:
+        items = []
+        for torrent, album_path, renamed in matches:
+            if renamed:
+                continue
+            with open(torrent["path"], "rb") as f:
+                data = f.read()
+            options = qb_add_options(config, album_path)
+            # A torrent named differently from the album directory gets the files straight in the directory
+            if torrent["name"] != os.path.basename(album_path):
+                options.update(savepath=album_path, contentLayout="NoSubfolder")
+            items.append({"directory": album_path, "name": os.path.basename(torrent["path"]), "data": data, "ledger": None, "tracker_name": None, "options": options})
+        for first in range(0, len(items), config['qBittorrent']['inject_batch_size']):
+            qb_add_torrent_files(config, items[first:first + config['qBittorrent']['inject_batch_size']])
+
+    not_read = f", {skipped} unreadable or single file" if skipped else ""
+    print(f"\n+ Cross-seed +\n{'━' * 50}")
+    print(f"{len(matches)} of {len(torrents)} torrents matched{not_read} in {time.monotonic() - started:.1f}s")
+    return matches
+
+# inotify event flags, see inotify(7)
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# Linux inotify through ctypes. Every directory below the root gets a watch, new directories are added as
+# they appear. poll() returns the directories in which files were written, created, moved or deleted
+class InotifyWatcher:
+    kind = "inotify"
+
+    def __init__(self, root, skip=()):
+        self.root = root
+        self.skip = skip
+        self.watches = {}
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_init1: {os.strerror(ctypes.get_errno())}")
+        try:
+            self.add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    # Watch a directory and everything below it. Returns the directories that already contain files
+    def add_tree(self, directory):
+        with_files = []
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            if is_below(path, self.skip):
+                continue
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                # Directories removed while walking are fine, running out of watches is not
+                if errno == 2:
+                    continue
+                raise OSError(errno, f"inotify_add_watch {path}: {os.strerror(errno)}")
+            self.watches[wd] = path
+            try:
+                with os.scandir(path) as entries:
+                    has_files = False
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        else:
+                            has_files = True
+            except FileNotFoundError:
+                continue
+            if has_files:
+                with_files.append(path)
+        return with_files
 
-def batch_process(artist_directory, tracker_name, config, output_base, tracker_announce, tracker_api_url, tracker_api_token, anonymous, personal_release, doubleup, internal, refundable, featured, sticky, source, bitrate, args):
-    # Process all albums in the artist directory
-    for album_dir in os.listdir(artist_directory):
-        album_path = os.path.join(artist_directory, album_dir)
-        if os.path.isdir(album_path):
-            process_album(album_path, tracker_name, config, output_base, tracker_announce, tracker_api_url, tracker_api_token, anonymous, personal_release, doubleup, internal, refundable, featured, sticky, source, bitrate, args)
+    def poll(self, timeout):
+        changed = set()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return changed
 
-def main():
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + name_length].rstrip(b"\0"))
+                offset += INOTIFY_EVENT.size + name_length
+
+                if mask & IN_Q_OVERFLOW:
+                    log_message("Watch: inotify event queue overflowed, some changes may be missed.", level="WARNING")
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                directory = self.watches.get(wd)
+                if directory is None:
+                    continue
+                if mask & IN_ISDIR:
+                    # A new (or moved in) directory may already be full, report everything in it
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        try:
+                            changed.update(self.add_tree(os.path.join(directory, name)))
+                        except OSError as e:
+                            log_message(f"Watch: {e}", level="WARNING")
+                    continue
+                changed.add(directory)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+# Number of files, total size and newest mtime of every directory below root that has files
+def directory_snapshots(root, skip=()):
+    snapshots = {}
+    pending = [root]
+    while pending:
+        path = pending.pop()
+        if is_below(path, skip):
+            continue
+        count, size, mtime = 0, 0, 0
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    else:
+                        stat = entry.stat(follow_symlinks=False)
+                        count, size, mtime = count + 1, size + stat.st_size, max(mtime, stat.st_mtime_ns)
+        except FileNotFoundError:
+            continue
+        if count:
+            snapshots[path] = (count, size, mtime)
+    return snapshots
+
+# Fallback for systems without inotify: walk the root every `interval` seconds and report the directories
+# whose files changed since the last walk
+class PollingWatcher:
+    kind = "polling"
+
+    def __init__(self, root, interval=10, skip=()):
+        self.root = root
+        self.interval = interval
+        self.skip = skip
+        self.snapshots = directory_snapshots(root, skip)
+        self.scanned = time.monotonic()
+
+    def poll(self, timeout):
+        wait_time = self.scanned + self.interval - time.monotonic()
+        if wait_time > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(0, wait_time))
+        snapshots = directory_snapshots(self.root, self.skip)
+        self.scanned = time.monotonic()
+        changed = {path for path, snapshot in snapshots.items() if self.snapshots.get(path) != snapshot}
+        self.snapshots = snapshots
+        return changed
+
+    def close(self):
+        pass
 
-    # Load configuration from config.json
-    config = load_config()
+# inotify on Linux, polling elsewhere or when inotify runs out of watches
+def open_watcher(root, config, skip=()):
+    if sys.platform.startswith("linux") and not config["watch_polling"]:
+        try:
+            return InotifyWatcher(root, skip)
+        except OSError as e:
+            log_message(f"Watch: inotify unavailable ({e}), polling instead.", level="WARNING")
+    return PollingWatcher(root, config["watch_poll_interval"], skip)
+
+# An album can be processed once it has audio files (right in it or in disc folders, like the albums of
+# iter_album_directories) and none of them is still being downloaded. Files written to an artist directory
+# do not make it an album
+def album_ready(directory, config):
+    try:
+        with os.scandir(directory) as entries:
+            if not is_album(list(entries), tuple(ext.lower() for ext in config["file_types"])):
+                return False
+    except OSError:
+        return False
+    try:
+        album_index = scan_album(directory, config["file_types"])
+    except FileNotFoundError:
+        return False
+    incomplete = tuple(config["watch_incomplete_suffixes"])
+    return bool(album_index.audio_files) and not any(path.endswith(incomplete) for path in album_index.file_sizes)
+
+# Watch a library root and process every album that is added to it, once its files stopped changing for
+# watch_settle_seconds. Albums that are there at startup are left alone. Runs until interrupted
+def watch_process(watch_root, job, config, output_base, jobs=1):
+    watch_root = os.path.abspath(watch_root)
+    settle_seconds = config["watch_settle_seconds"]
+    jobs = max(1, jobs)
+    # inferno's own output must not trigger new work when it is inside the watched root
+    skip = [os.path.abspath(output_base), os.path.abspath(get_cache_dir(config, output_base))]
+
+    watcher = open_watcher(watch_root, config, skip)
+    log_message(f"Watching {watch_root} for new albums ({watcher.kind}, {jobs} at a time). Ctrl-C to stop.", level="INFO")
+
+    # Album directory -> time of its last change, and the albums being processed
+    changed = {}
+    running = {}
+    results = BatchResults()
+    started = time.monotonic()
+    if jobs > 1:
+        start_hash_pool(min(jobs, os.cpu_count() or 1))
+    album_pool = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        while True:
+            for directory in watcher.poll(1.0):
+                album_directory = album_directory_of(directory, watch_root)
+                if album_directory:
+                    changed[album_directory] = time.monotonic()
+
+            # Albums that were quiet long enough go to the pool. An album changing while it is processed
+            # waits and is processed again afterwards
+            now = time.monotonic()
+            in_progress = set(running.values())
+            for album_directory, last_change in list(changed.items()):
+                if now - last_change < settle_seconds or album_directory in in_progress:
+                    continue
+                del changed[album_directory]
+                if album_ready(album_directory, config):
+                    album_runner = batch_album_grouped if jobs > 1 else batch_album
+                    album_job = dataclasses.replace(job, directory=album_directory)
+                    running[submit_in_context(album_pool, album_runner, album_job, config, output_base)] = album_directory
+
+            for future in [future for future in running if future.done()]:
+                del running[future]
+                name, status, seconds = future.result()
+                results.add((name, status, seconds))
+                log_message(f"Watch: {name} - {status} ({seconds:.1f}s)", level="INFO")
+    except KeyboardInterrupt:
+        log_message("Watch: stopping, waiting for albums in progress.", level="INFO")
+        album_pool.shutdown(wait=True, cancel_futures=True)
+        for future in running:
+            if future.done() and not future.cancelled():
+                results.add(future.result())
+    finally:
+        watcher.close()
+        album_pool.shutdown(wait=False, cancel_futures=True)
+        stop_hash_pool()
+
+    if results:
+        print_batch_summary(results, time.monotonic() - started)
+
+# Problem with a tracker of config.toml that keeps it from being uploaded to, or None
+def tracker_problem(config, tracker_name):
+    if not config["trackers"].get(tracker_name):
+        return f"tracker code '{tracker_name}' is not in config.toml"
+    missing = [key for key in REQUIRED_TRACKER_SETTINGS if not config["trackers"][tracker_name].get(key)]
+    if missing:
+        return f"tracker '{tracker_name}' in config.toml is missing {', '.join(missing)}"
+    return None
 
-    # Check if the logo should be displayed
-    if config.get("display_logo", True):
-        inferno_logo()
+# Album job of a request to the job server. Fields left out come from the server's own flags, only the
+# directory is required. Raises ValueError for a job that can not run
+def server_album_job(template, request, config):
+    if not isinstance(request, dict):
+        raise ValueError("a job is a JSON object")
+    fields = {field.name: field.type for field in dataclasses.fields(AlbumJob)}
+    unknown = [key for key in request if key not in fields]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+
+    values = {}
+    for key, value in request.items():
+        expected = fields[key]
+        if key == "bitrate" and value is None:
+            pass
+        elif expected is int and isinstance(value, bool):
+            value = int(value)
+        elif not isinstance(value, expected) or (expected is int) != (type(value) is int):
+            raise ValueError(f"'{key}' must be {expected.__name__}")
+        values[key] = value
+    job = dataclasses.replace(template, **values)
+
+    if not job.directory or not os.path.isdir(job.directory):
+        raise ValueError(f"not a directory: {job.directory}")
+    if not job.tracker_names or not all(isinstance(tracker_name, str) for tracker_name in job.tracker_names):
+        raise ValueError("'tracker_names' must be a non-empty list of tracker codes")
+    for tracker_name in job.tracker_names:
+        problem = tracker_problem(config, tracker_name)
+        if problem:
+            raise ValueError(problem)
+    if not job.source:
+        raise ValueError("'source' is required")
+    return dataclasses.replace(job, directory=os.path.abspath(job.directory), tracker_names=list(dict.fromkeys(job.tracker_names)))
+
+# Finished jobs the job server keeps for GET /jobs, older ones are dropped
+SERVER_JOB_HISTORY = 500
+
+# Album jobs submitted to the job server, run on its album pool. A job is a dict with its state
+# (queued, running, finished or cancelled), the album's status and the log lines of its run
+class JobQueue:
+    def __init__(self, template, config, output_base, workers):
+        self.template = template
+        self.config = config
+        self.output_base = output_base
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.jobs = OrderedDict()
+        # Album directory -> its queued or running job, so a directory is never processed twice at once
+        self.active = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.closing = False
+
+    # Queue a job request. Returns the job and whether it is new, a directory already queued or running
+    # returns the job it is part of. Raises RuntimeError once the server is shutting down
+    def submit(self, request):
+        job = server_album_job(self.template, request, self.config)
+        with self.lock:
+            if self.closing:
+                raise RuntimeError("the server is shutting down")
+            entry = self.active.get(job.directory)
+            if entry is not None:
+                return entry, False
+            entry = {"id": next(self.ids), "state": "queued", "job": job, "status": None, "seconds": None,
+                     "submitted": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"), "log": []}
+            self.jobs[entry["id"]] = entry
+            self.active[job.directory] = entry
+        try:
+            submit_in_context(self.pool, self.run, entry)
+        except RuntimeError:
+            with self.lock:
+                entry["state"] = "cancelled"
+                del self.active[job.directory]
+            raise RuntimeError("the server is shutting down")
+        log_message(f"Serve: job {entry['id']} queued: {job.directory}", level="INFO")
+        return entry, True
+
+    # Run a job on the album pool. Its log lines are kept with the job and printed once it is done
+    def run(self, entry):
+        with self.lock:
+            entry["state"] = "running"
+        token = album_log.set(entry["log"])
+        try:
+            _, status, seconds = batch_album(entry["job"], self.config, self.output_base)
+        finally:
+            album_log.reset(token)
+            with print_lock:
+                print("\n".join(entry["log"]))
+        with self.lock:
+            entry.update(state="finished", status=status, seconds=round(seconds, 3))
+            del self.active[entry["job"].directory]
+            finished = [job_id for job_id, other in self.jobs.items() if other["state"] in ("finished", "cancelled")]
+            for job_id in finished[:-SERVER_JOB_HISTORY]:
+                del self.jobs[job_id]
+        # Album reports, if kept for --report, are kept as long as the jobs
+        with metrics_lock:
+            if album_reports is not None:
+                del album_reports[:-SERVER_JOB_HISTORY]
+        log_message(f"Serve: job {entry['id']} - {status} ({seconds:.1f}s)", level="INFO")
+
+    def get(self, job_id):
+        with self.lock:
+            entry = self.jobs.get(job_id)
+            return None if entry is None else self.describe(entry, with_log=True)
+
+    def list(self):
+        with self.lock:
+            return [self.describe(entry) for entry in self.jobs.values()]
+
+    def describe(self, entry, with_log=False):
+        described = {key: value for key, value in entry.items() if key not in ("job", "log")}
+        described["job"] = dataclasses.asdict(entry["job"])
+        if with_log:
+            described["log"] = list(entry["log"])
+        return described
+
+    def status(self):
+        uptime = time.monotonic() - self.started
+        with self.lock:
+            states = {}
+            for entry in self.jobs.values():
+                states[entry["state"]] = states.get(entry["state"], 0) + 1
+        with metrics_lock:
+            summary = run_summary(uptime, self.workers)
+        return {"uptime": round(uptime, 3), "jobs": states, "run": summary}
+
+    # Finish the running jobs and drop the queued ones. Returns the BatchResults of the finished jobs
+    def shutdown(self):
+        with self.lock:
+            self.closing = True
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        with self.lock:
+            for entry in self.jobs.values():
+                if entry["state"] == "queued":
+                    entry["state"] = "cancelled"
+            results = BatchResults()
+            for entry in self.jobs.values():
+                if entry["state"] == "finished":
+                    results.add((os.path.basename(entry["job"].directory), entry["status"], entry["seconds"]))
+            return results
+
+# HTTP handler and servers of --serve, built on first use so other runs do not import http.server
+@functools.cache
+def job_server_classes():
+    import http.server
+    import socketserver
+
+    class JobRequestHandler(http.server.BaseHTTPRequestHandler):
+        server_version = "inferno"
+
+        # Requests are not logged, the jobs log themselves
+        def log_message(self, format, *args):
+            pass
+
+        # Requests a web page could make: a browser sends Origin with cross-origin POSTs, a DNS-rebinding page
+        # reaches the port under its own Host name. (status, error) of the refusal, None when the request may go through
+        def refused(self, needs_json=False):
+            if self.headers.get("Origin") is not None:
+                return 403, "requests from web pages are not accepted"
+            if not isinstance(self.server, socketserver.UnixStreamServer) and not is_loopback_host(urlsplit(f"//{self.headers.get('Host', '')}").hostname):
+                return 403, "the Host header is not localhost or a loopback address"
+            if needs_json and self.headers.get_content_type() != "application/json":
+                return 415, "the Content-Type is not application/json"
+            return None
 
-    # Setup MusicBrainz with the configuration
-    setup_musicbrainz(config)
+        def send_json(self, code, body):
+            data = json.dumps(body, indent=2).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            refusal = self.refused()
+            if refusal:
+                self.send_json(refusal[0], {"error": refusal[1]})
+                return
+            queue = self.server.job_queue
+            path = urlsplit(self.path).path.rstrip("/")
+            if path == "/status":
+                self.send_json(200, queue.status())
+            elif path == "/jobs":
+                self.send_json(200, queue.list())
+            elif path.startswith("/jobs/") and path[len("/jobs/"):].isdigit():
+                entry = queue.get(int(path[len("/jobs/"):]))
+                if entry is None:
+                    self.send_json(404, {"error": "no such job"})
+                else:
+                    self.send_json(200, entry)
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if urlsplit(self.path).path.rstrip("/") != "/jobs":
+                self.send_json(404, {"error": "not found"})
+                return
+            refusal = self.refused(needs_json=True)
+            if refusal:
+                self.send_json(refusal[0], {"error": refusal[1]})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"null")
+            except ValueError:
+                self.send_json(400, {"error": "the body is not JSON"})
+                return
+            try:
+                entry, created = self.server.job_queue.submit(request)
+            except ValueError as e:
+                self.send_json(400, {"error": str(e)})
+                return
+            except RuntimeError as e:
+                self.send_json(503, {"error": str(e)})
+                return
+            self.send_json(201 if created else 200, self.server.job_queue.describe(entry))
+
+    class UnixJobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    return JobRequestHandler, http.server.ThreadingHTTPServer, UnixJobServer
+
+# Whether a host name is localhost or a loopback address
+def is_loopback_host(host):
+    import ipaddress
+
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host or "").is_loopback
+    except ValueError:
+        return False
+
+# Serve album jobs on a Unix socket (a path) or on localhost HTTP (PORT or HOST:PORT, HOST a loopback address)
+# until Ctrl-C. Config, caches, pooled HTTP sessions and the qBittorrent login stay warm between jobs. The API
+# has no authentication and uploads with the tracker tokens of config.toml, so it never listens on the network
+def serve_process(address, job, config, output_base, jobs=1):
+    handler, tcp_server, unix_server = job_server_classes()
+    jobs = max(1, jobs)
+    socket_path = address if "/" in address else None
+    try:
+        if socket_path:
+            # A socket file left by a server that did not shut down is replaced, one that answers is not
+            if os.path.exists(socket_path):
+                with contextlib.suppress(OSError), socket.socket(socket.AF_UNIX) as probe:
+                    probe.connect(socket_path)
+                    raise ValueError(f"another server is listening on {socket_path}")
+                os.unlink(socket_path)
+            server = unix_server(socket_path, handler)
+            os.chmod(socket_path, 0o660)
+        else:
+            host, _, port = address.rpartition(":")
+            if not port.isdigit():
+                raise ValueError("expected a socket path, PORT or HOST:PORT")
+            host = host or "127.0.0.1"
+            if not is_loopback_host(host):
+                raise ValueError(f"{host} is not a loopback address, the job server only listens on localhost")
+            server = tcp_server((host, int(port)), handler)
+    except (OSError, ValueError) as e:
+        log_message(f"Error serving on '{address}': {e}", level="ERROR")
+        sys.exit(1)
+
+    server.job_queue = JobQueue(job, config, output_base, jobs)
+    if jobs > 1:
+        start_hash_pool(min(jobs, os.cpu_count() or 1))
+    log_message(f"Serving album jobs on {address} ({jobs} at a time). Ctrl-C to stop.", level="INFO")
+    started = time.monotonic()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log_message("Serve: stopping, waiting for jobs in progress.", level="INFO")
+    finally:
+        server.server_close()
+        if socket_path:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(socket_path)
+        results = server.job_queue.shutdown()
+        stop_hash_pool()
+
+    if results:
+        print_batch_summary(results, time.monotonic() - started)
+
+def main():
 
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Audio uploader for UNIT3D trackers.")
-    parser.add_argument("-d", "--directory", required=True, help="Path to the directory containing audio files or an artist directory.")
+    parser.add_argument("-d", "--directory", help="Path to the directory containing audio files or an artist directory.")
     parser.add_argument("-b", "--batch", action="store_true", help="Batch process all albums in an artist directory.")
     parser.add_argument("-o", "--output", help="Output directory. Defaults to config.json if not specified.")
-    parser.add_argument("-t", "--tracker", required=True, help="Tracker name from config.json.")
+    parser.add_argument("-t", "--tracker", nargs="+", help="Tracker name(s) from config.toml. Several trackers share one hashing run.")
     parser.add_argument("-anon", "--anonymous", action="store_true", help="Set upload as anonymous. Defaults to non-anonymous, if not specified.")
-    parser.add_argument("-s", "--source", required=True, help="Source of the files (e.g., WEB, CD).")
-    parser.add_argument("-br", "--bitrate", required=False, help="Bitrate of the files (e.g., V0, 320).")
+    parser.add_argument("-s", "--source", help="Source of the files (e.g., WEB, CD).")
+    parser.add_argument("-br", "--bitrate", required=False, help="Bitrate of the files (e.g., V0, 320). Derived from the files if not given, albums that do not match it are rejected.")
     parser.add_argument("-pr", "--personal_release", action="store_true", help="Set upload as personal release. Defaults to non-personal release, if not specified.")
     parser.add_argument("-du", "--doubleup", action="store_true", help="Set torrent as double upload. Only available to staff and internal users.")
     parser.add_argument("-in", "--internal", action="store_true", help="Set torrent as internal release. Only available to staff and internal users.")
@@ -523,22 +3009,71 @@ def main():
     parser.add_argument("-st", "--sticky", action="store_true", help="Set torrent as sticky release. Only available to staff and internal users.")
     parser.add_argument("-i", "--inject", action="store_true", help="Inject the torrent URL into qBittorrent after upload.")
     parser.add_argument("-dr", "--dry-run", action="store_true", help="Simulate operations without making actual changes.")
+    parser.add_argument("--no-hash-cache", action="store_true", help="Hash every piece again instead of reusing piece hashes from earlier runs.")
+    parser.add_argument("--force", action="store_true", help="Process albums again even if the upload ledger has them as uploaded.")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of albums to process at the same time in batch mode. Defaults to 1.")
+    parser.add_argument("-w", "--watch", metavar="ROOT", help="Keep running and process every album added below ROOT once its files stop changing.")
+    parser.add_argument("-l", "--library", metavar="ROOT", help="Process every album below ROOT, at any depth.")
+    parser.add_argument("--include", action="append", metavar="GLOB", help="With --library, only albums whose path relative to ROOT matches. Can be given more than once.")
+    parser.add_argument("--exclude", action="append", metavar="GLOB", help="With --library, skip albums and directories whose path relative to ROOT matches. Can be given more than once.")
+    parser.add_argument("--order", choices=["name", "mtime"], default="name", help="With --library, crawl order within each directory: name, or mtime (oldest first). Defaults to name.")
+    parser.add_argument("--report", choices=["json"], help="Write stage timings, bytes hashed and HTTP calls of every album and of the run.")
+    parser.add_argument("--report-file", help="Path of the run report. Defaults to inferno-report.json in the output directory.")
+    parser.add_argument("--profile", nargs="?", const="inferno.prof", metavar="FILE", help="Profile the run with cProfile and save the stats. Defaults to inferno.prof.")
+    parser.add_argument("--cross-seed", nargs="+", metavar="TORRENT", help="Match .torrent files (or directories of them) against the albums of -d, -b -d or -l, verifying sampled pieces. With -i matches are added to qBittorrent.")
+    parser.add_argument("--samples", type=int, metavar="N", help=f"With --cross-seed, pieces hashed to confirm a match. Defaults to {CROSS_SEED_SAMPLES}.")
+    parser.add_argument("--serve", metavar="ADDRESS", help="Run as a job server on a Unix socket (a path) or localhost HTTP (PORT, or HOST:PORT with a loopback HOST). Flags given with it are the defaults of submitted jobs.")
+    parser.add_argument("--build-mb-index", metavar="DUMP", help="Build the offline MusicBrainz index from release.tar.xz of a MusicBrainz JSON dump, then exit.")
 
     args = parser.parse_args()
+    if args.cross_seed:
+        if not args.directory and not args.library:
+            parser.error("--cross-seed needs albums: -d/--directory or -l/--library")
+    elif not args.build_mb_index and not args.serve:
+        if not args.tracker or not args.source:
+            parser.error("the following arguments are required: -t/--tracker, -s/--source")
+        if not args.directory and not args.watch and not args.library:
+            parser.error("one of the arguments -d/--directory -w/--watch -l/--library is required")
+
+    # Load and validate the configuration once, every stage gets this dict
+    config, problems = load_config()
+    for problem in problems:
+        log_message(f"Error in config.toml: {problem}", level="ERROR")
+    if problems:
+        sys.exit(1)
+
+    # Check if the logo should be displayed
+    if config["display_logo"]:
+        inferno_logo(config["inferno_logo"])
+
+    # Setup MusicBrainz and the HTTP client with the configuration
+    setup_musicbrainz(config)
+    setup_http(config)
+
+    # The offline MusicBrainz index lives in the cache folder unless config.toml says otherwise
+    output_base = args.output or config["output_dir"] or os.getcwd()
+    if not config.get("musicbrainz_index"):
+        config["musicbrainz_index"] = os.path.join(get_cache_dir(config, output_base), MUSICBRAINZ_INDEX_FILENAME)
+    if args.build_mb_index:
+        try:
+            build_musicbrainz_index(args.build_mb_index, config["musicbrainz_index"])
+        except (OSError, ValueError, sqlite3.Error) as e:
+            log_message(f"Error building the MusicBrainz index: {e}", level="ERROR")
+            sys.exit(1)
+        return
+    if args.cross_seed:
+        cross_seed(args.cross_seed, args.directory, config, output_base, args)
+        return
 
     # Fallback if no config value or command line argument is provided
     directory = args.directory
-    tracker_name = args.tracker
-    tracker_config = config.get("trackers", {}).get(tracker_name)
+    tracker_names = list(dict.fromkeys(args.tracker or []))
 
-    if not tracker_config:
-        log_message(f"Error: Tracker flag must be provided or provided tracker code is incorrect.", level="WARNING")
-        sys.exit(1)
-
-    tracker_announce = tracker_config.get("tracker_announce")
-    tracker_api_url = tracker_config.get("tracker_api_url")
-    tracker_api_token = tracker_config.get("tracker_api_token")
-    output_base = args.output or config.get("output_dir") or os.getcwd()
+    for tracker_name in tracker_names:
+        problem = tracker_problem(config, tracker_name)
+        if problem:
+            log_message(f"Error: {problem}.", level="ERROR")
+            sys.exit(1)
 
     # Set the 'anonymous' value based on the flag
     anonymous = 1 if args.anonymous else 0
@@ -561,21 +3096,54 @@ def main():
     # Set the 'sticky' value based on the flag
     sticky = 1 if args.sticky else 0
 
-    if args.batch:
-        batch_process(directory, tracker_name, config, output_base, tracker_announce, tracker_api_url, tracker_api_token, anonymous, personal_release, doubleup, internal, refundable, featured, sticky, args.source, args.bitrate, args)
-    else:
-        process_album(directory, tracker_name, config, output_base, tracker_announce, tracker_api_url, tracker_api_token, anonymous, personal_release, doubleup, internal, refundable, featured, sticky, args.source, args.bitrate, args)
+    # The job every album of this run is processed with
+    job = AlbumJob(directory=directory, tracker_names=tracker_names, source=args.source, bitrate=args.bitrate,
+                   anonymous=anonymous, personal_release=personal_release, doubleup=doubleup, internal=internal,
+                   refundable=refundable, featured=featured, sticky=sticky, inject=args.inject,
+                   dry_run=args.dry_run, force=args.force, no_hash_cache=args.no_hash_cache)
+    jobs = max(1, args.jobs)
+    if args.report:
+        keep_album_reports()
+
+    run_started = time.monotonic()
+    with profiled_run(args.profile):
+        if args.serve:
+            serve_process(args.serve, job, config, output_base, jobs)
+        elif args.watch:
+            watch_process(args.watch, job, config, output_base, jobs)
+        elif args.library:
+            library_process(args.library, job, config, output_base, jobs, args.include or (), args.exclude or (), args.order)
+        elif args.batch:
+            batch_process(directory, job, config, output_base, jobs)
+        else:
+            process_album(job, config, output_base)
+    summary = run_summary(time.monotonic() - run_started, jobs)
 
     # Resolve the output directory
-    output_base = args.output or config.get("output_dir")
+    output_base = args.output or config["output_dir"]
     if not output_base:
         log_message("No output directory specified. Please provide one in the config file or via the '-o' option.", level="ERROR")
         sys.exit(1)
 
     # Clear the output directory if the setting is enabled
-    if config.get("clear_output_dir"):
+    if config["clear_output_dir"]:
         clear_output_directory(output_base)
 
+    # Run reports are written after clearing so they are kept
+    if args.report == "json":
+        report_path = args.report_file or os.path.join(output_base, "inferno-report.json")
+        try:
+            write_run_report(report_path, summary)
+            log_message(f"Run Report: {report_path}", level="INFO")
+        except OSError as e:
+            log_message(f"Error writing run report '{report_path}': {e}", level="ERROR")
+    prometheus_textfile = config.get("prometheus_textfile")
+    if prometheus_textfile:
+        try:
+            write_prometheus_textfile(prometheus_textfile, summary)
+        except OSError as e:
+            log_message(f"Error writing Prometheus textfile '{prometheus_textfile}': {e}", level="ERROR")
+
     print(f"\n+ And so we ascend, our task in the Inferno complete +\n")
 
 if __name__ == "__main__":